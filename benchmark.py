@@ -0,0 +1,637 @@
+"""Offline end-to-end benchmark for the LinkedIn agent.
+
+Drives LinkedInAgent over generated sheets without touching any real
+account. A local HTTP server stands in for the LinkedIn v2 endpoints
+(registerUpload, media upload, ugcPosts, userinfo) and for Unsplash
+(search/photos and the image download), while the Google Sheets service and
+the Gemini model are replaced by in-process fakes. Latency and error rates
+can be set per service.
+
+Each sheet size runs in a fresh process and reports rows/sec, p50/p99 per
+stage and peak RSS. Save the results with --output and compare a later run
+against them with --baseline: the exit status is 1 when throughput, a
+stage's p99 or peak memory regress by more than --tolerance, so the script
+can be used as a regression gate.
+
+    python benchmark.py                                  # 10, 1000 and 10000 rows
+    python benchmark.py --rows 1000 --latency gemini=800 --latency linkedin=150
+    python benchmark.py --rows 1000 --error-rate unsplash=0.05
+    python benchmark.py --rows 1000 --output baseline.json
+    python benchmark.py --rows 1000 --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from types import SimpleNamespace
+
+import linkedin_agent
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SERVICES = ('gemini', 'sheets', 'linkedin', 'unsplash')
+DEFAULT_ROWS = (10, 1000, 10000)
+DEFAULT_TOLERANCE = 0.2
+# p99 differences smaller than this are treated as noise by the regression check
+MIN_P99_DELTA_MS = 5.0
+LATENCY_JITTER = 0.25
+# Size of the served photos, matching Unsplash's 1080px wide 'regular' URLs
+FAKE_IMAGE_SIZE = (1080, 720)
+
+# Hosts the agent talks to, and which simulated service answers for each
+SERVICE_HOSTS = {
+    'api.linkedin.com': 'linkedin',
+    'www.linkedin.com': 'linkedin',
+    'api.unsplash.com': 'unsplash',
+    'images.unsplash.com': 'unsplash',
+}
+
+FAKE_POST = """{emoji} **{topic}**
+
+A short, engaging introduction to {topic} that sets up why it matters to
+professionals right now.
+
+🔑 Why it matters
+{topic} changes how teams plan, build and measure their work. Early adopters
+report faster feedback loops and clearer priorities.
+
+💡 Getting started
+Start small, measure the results and share what you learn with your network.
+
+What is your experience with {topic}? Share it in the comments!
+
+#LinkedInPost #Benchmark #Automation"""
+
+
+class FaultInjector:
+    """Sleeps for a service's configured latency and decides whether a call fails"""
+
+    def __init__(self, latency_ms, error_rates, jitter=LATENCY_JITTER, seed=None):
+        self.latency_ms = latency_ms
+        self.error_rates = error_rates
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, service):
+        """Wait out the latency for one call to service; returns True if the call should fail"""
+        with self._lock:
+            jitter = self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            failed = self.random.random() < self.error_rates.get(service, 0.0)
+        latency = self.latency_ms.get(service, 0.0) * jitter / 1000.0
+        if latency > 0:
+            time.sleep(latency)
+        return failed
+
+
+class FakeServer:
+    """Local stand-in for the LinkedIn and Unsplash HTTP APIs
+
+    Listing posts (GET ugcPosts?q=authors) needs the r_member_social
+    permission, which the agent's token does not ask for; like the real API
+    it answers 403 unless post_lookup is set.
+    """
+
+    def __init__(self, inject, image_size=FAKE_IMAGE_SIZE, image_pool=0, post_lookup=False):
+        self.inject = inject
+        self.image = self._make_image(image_size)
+        self.image_pool = image_pool
+        self.post_lookup = post_lookup
+        self.requests = {}
+        self.posts = 0
+        self.created = []  # ugcPosts bodies with their ids, newest last
+        self._ids = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    @staticmethod
+    def _make_image(size):
+        from PIL import Image
+
+        image = Image.linear_gradient('L').resize(size).convert('RGB')
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=95)
+        return output.getvalue()
+
+    def next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def count(self, endpoint, status):
+        with self._lock:
+            stats = self.requests.setdefault(endpoint, {'calls': 0, 'errors': 0})
+            stats['calls'] += 1
+            stats['errors'] += int(status >= 400)
+            if endpoint == 'ugcPosts' and status == 201:
+                self.posts += 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='fake-api', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def route(self, method, host, path, query, body):
+        """Return (endpoint, status, headers, body) for one request"""
+        if host == 'api.unsplash.com' and path == '/search/photos':
+            topic = urllib.parse.quote(query.get('query', [''])[0])
+            results = []
+            for _ in range(int(query.get('per_page', ['10'])[0])):
+                photo = self.next_id()
+                if self.image_pool:
+                    photo = photo % self.image_pool
+                results.append({'id': str(photo), 'urls': {'regular': f'https://images.unsplash.com/photo-{photo}?q={topic}'}})
+            return 'search/photos', 200, {}, {'total': len(results), 'results': results}
+        if host == 'images.unsplash.com' and path.startswith('/photo-'):
+            # Unique trailing bytes give every photo its own content hash
+            return 'image', 200, {'Content-Type': 'image/jpeg'}, self.image + path.encode('utf-8')
+        if host == 'api.linkedin.com' and path == '/v2/assets' and query.get('action') == ['registerUpload']:
+            media = self.next_id()
+            data = {'value': {
+                'asset': f'urn:li:digitalmediaAsset:{media}',
+                'uploadMechanism': {'com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest': {
+                    'uploadUrl': f'https://api.linkedin.com/mediaUpload/{media}',
+                }},
+            }}
+            return 'registerUpload', 200, {}, data
+        if host == 'api.linkedin.com' and path.startswith('/mediaUpload/') and method == 'PUT':
+            return 'upload', 201, {}, None
+        if host == 'api.linkedin.com' and path == '/v2/ugcPosts' and method == 'POST':
+            post = dict(json.loads(body), id=f'urn:li:share:{self.next_id()}')
+            with self._lock:
+                self.created.append(post)
+            return 'ugcPosts', 201, {'x-restli-id': post['id']}, {}
+        if host == 'api.linkedin.com' and path == '/v2/ugcPosts' and query.get('q') == ['authors']:
+            if not self.post_lookup:
+                return 'ugcPosts.authors', 403, {}, {'message': 'Not enough permissions to access: GET /ugcPosts'}
+            with self._lock:
+                posts = list(reversed(self.created))
+            authors = query.get('authors', [''])[0]
+            count = int(query.get('count', ['10'])[0])
+            return 'ugcPosts.authors', 200, {}, {'elements': [post for post in posts if post['author'] in authors][:count]}
+        if host == 'api.linkedin.com' and path == '/v2/userinfo':
+            return 'userinfo', 200, {}, {'sub': 'benchmark', 'name': 'Benchmark User'}
+        return 'unknown', 404, {}, {'message': f'No fake for {method} {host}{path}'}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real APIs
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms per call
+            disable_nagle_algorithm = True
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                _, host, rest = self.path.split('/', 2)
+                parsed = urllib.parse.urlsplit('/' + rest)
+                endpoint, status, headers, data = fake.route(
+                    self.command, host, parsed.path, urllib.parse.parse_qs(parsed.query), body)
+                if status < 400 and fake.inject(SERVICE_HOSTS.get(host, 'linkedin')):
+                    status, headers, data = 503, {}, {'message': 'Injected failure'}
+                fake.count(endpoint, status)
+                if isinstance(data, bytes):
+                    payload = data
+                else:
+                    payload = json.dumps(data).encode('utf-8') if data is not None else b''
+                    headers.setdefault('Content-Type', 'application/json')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class _LocalAdapter:
+    """Sends a request to the fake server through the adapter chosen for its real URL"""
+
+    def __init__(self, adapter, base_url):
+        self.adapter = adapter
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        request.url = f"{self.base_url}/{request.url.split('://', 1)[1]}"
+        return self.adapter.send(request, **kwargs)
+
+    def close(self):
+        self.adapter.close()
+
+
+class LocalHTTPSession(linkedin_agent.HTTPSession):
+    """HTTPSession that routes https:// calls to the fake server.
+
+    Adapters are still picked by the original URL, so per-host pools and
+    the retry policy of each endpoint behave as in production.
+    """
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def get_adapter(self, url):
+        adapter = super().get_adapter(url)
+        if url.startswith('https://'):
+            return _LocalAdapter(adapter, self.base_url)
+        return adapter
+
+
+class FakeRequest:
+    def __init__(self, inject, func):
+        self.inject = inject
+        self.func = func
+
+    def execute(self):
+        if self.inject('sheets'):
+            raise RuntimeError('Injected Sheets API failure (503)')
+        return self.func()
+
+
+class FakeSheetValues:
+    """In-memory spreadsheets().values() supporting the calls the agent makes"""
+
+    RANGE = re.compile(r'(?:[^!]+!)?([A-Z])(\d*)(?::([A-Z])(\d*))?$')
+
+    def __init__(self, rows, inject):
+        self.rows = rows
+        self.inject = inject
+        self.calls = {}
+
+    def _count(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    def _parse(self, cell_range):
+        first_col, first_row, last_col, last_row = self.RANGE.match(cell_range).groups()
+        if last_col is None:
+            last_col, last_row = first_col, first_row
+        first_row = int(first_row) if first_row else 1
+        last_row = int(last_row) if last_row else len(self.rows)
+        return ord(first_col) - ord('A'), ord(last_col) - ord('A'), first_row - 1, last_row
+
+    def _read(self, cell_range):
+        first_col, last_col, start, stop = self._parse(cell_range)
+        values = []
+        for row in self.rows[start:stop]:
+            cells = row[first_col:last_col + 1]
+            while cells and not cells[-1]:
+                cells = cells[:-1]
+            values.append(cells)
+        # Like the real API, trailing empty rows are left out
+        while values and not values[-1]:
+            values.pop()
+        return {'range': cell_range, 'values': values} if values else {'range': cell_range}
+
+    def _write(self, cell_range, values):
+        first_col, _, start, _ = self._parse(cell_range)
+        for offset, cells in enumerate(values):
+            while len(self.rows) <= start + offset:
+                self.rows.append([])
+            row = self.rows[start + offset]
+            row.extend([''] * (first_col + len(cells) - len(row)))
+            row[first_col:first_col + len(cells)] = cells
+
+    def get(self, spreadsheetId, range, **kwargs):
+        self._count('get')
+        return FakeRequest(self.inject, lambda: self._read(range))
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        self._count('batchGet')
+        return FakeRequest(self.inject, lambda: {'valueRanges': [self._read(r) for r in ranges]})
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        self._count('update')
+        return FakeRequest(self.inject, lambda: self._write(range, body['values']) or {})
+
+    def batchUpdate(self, spreadsheetId, body):
+        self._count('batchUpdate')
+
+        def execute():
+            for data in body['data']:
+                self._write(data['range'], data['values'])
+            return {'totalUpdatedRows': len(body['data'])}
+        return FakeRequest(self.inject, execute)
+
+
+class FakeSheetsService:
+    def __init__(self, rows, inject):
+        self._values = FakeSheetValues(rows, inject)
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self._values
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel returning a fixed-shape post per prompt.
+
+    Batched prompts get a JSON object with one post per listed topic;
+    streamed calls yield the post in small chunks after the configured latency.
+    """
+
+    CHUNK_CHARS = 80
+
+    TOPIC = re.compile(r'LinkedIn post about (.+?)\.\s*\n')
+    BATCH_TOPIC = re.compile(r'^- (".*?") \(hook emoji', re.MULTILINE)
+
+    def __init__(self, inject):
+        self.inject = inject
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        if self.inject('gemini'):
+            raise RuntimeError('Injected Gemini failure (503 Service Unavailable)')
+        batch = [json.loads(topic) for topic in self.BATCH_TOPIC.findall(prompt)]
+        if batch:
+            text = json.dumps({topic: FAKE_POST.format(emoji='💡', topic=topic) for topic in batch})
+        else:
+            match = self.TOPIC.search(prompt)
+            text = FAKE_POST.format(emoji='💡', topic=match.group(1) if match else 'the topic')
+        # Roughly four characters per token, reported like the API does (on the last chunk when streaming)
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4 + 1, candidates_token_count=len(text) // 4 + 1)
+        if stream:
+            chunks = [FakeResponse(text[i:i + self.CHUNK_CHARS]) for i in range(0, len(text), self.CHUNK_CHARS)]
+            chunks[-1].usage_metadata = usage
+            return chunks
+        return FakeResponse(text, usage)
+
+
+def make_topics(count, seed):
+    """Distinct made-up topics, unlike each other enough to pass near-duplicate detection"""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < 3000:
+        words.add(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10))))
+    words = sorted(words)
+    return [' '.join(rng.sample(words, 3)).title() for _ in range(count)]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it cannot be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_size(rows, options):
+    """Benchmark one sheet size in the current process and return its results"""
+    workdir = tempfile.mkdtemp(prefix='linkedin-agent-bench-')
+    os.chdir(workdir)  # Caches, cursor and token files stay out of the real working directory
+    os.environ.update({
+        'GOOGLE_API_KEY': 'benchmark', 'LINKEDIN_CLIENT_ID': 'benchmark', 'LINKEDIN_CLIENT_SECRET': 'benchmark',
+        'SPREADSHEET_ID': 'benchmark', 'UNSPLASH_ACCESS_KEY': 'benchmark',
+    })
+    with open(linkedin_agent.LINKEDIN_TOKEN_FILE, 'w') as f:
+        json.dump({'access_token': 'benchmark', 'expires_at': time.time() + 60 * 24 * 3600,
+                   'linkedin_id': 'benchmark'}, f)
+    linkedin_agent.configure_logging(options['log_level'])
+
+    inject = FaultInjector(options['latency'], options['error_rate'], seed=options['seed'])
+    server = FakeServer(inject, image_pool=options['image_pool']).start()
+    sheet = [['Topic', 'Content', 'Image', 'Status']] + [[topic] for topic in make_topics(rows, options['seed'])]
+    profiler = None
+    if options['profile']:
+        profiler = linkedin_agent.StageProfiler(os.path.join(options['profile'], f'{rows}-rows'))
+    try:
+        agent = linkedin_agent.LinkedInAgent(use_cache=options['cache'], posts_per_minute=options['posts_per_minute'],
+                                             generate_batch_size=options['generate_batch'],
+                                             post_burst=max(1, options['post_workers']), profiler=profiler)
+        agent.http = LocalHTTPSession(server.base_url)
+        agent.service = FakeSheetsService(sheet, inject)
+        agent.model = FakeGenerativeModel(inject)
+        pipeline = None
+        if options['pipeline']:
+            pipeline = linkedin_agent.PostPipeline(agent, concurrency={'post': options['post_workers']})
+
+        start = time.perf_counter()
+        try:
+            agent.process_spreadsheet_and_post(process_all=True, pipeline=pipeline)
+        finally:
+            elapsed = time.perf_counter() - start
+            if agent.image_pool is not None:
+                agent.image_pool.shutdown()
+        agent.write_profiles()
+    finally:
+        server.stop()
+
+    synced = sum(1 for row in sheet[1:] if len(row) > 3 and row[3] == linkedin_agent.SHEET_STATUS_DONE)
+    stages = {name: {'count': stage['count'], 'errors': stage['errors'],
+                     'p50_ms': stage['p50_seconds'] * 1000, 'p99_ms': stage['p99_seconds'] * 1000}
+              for name, stage in agent.metrics.snapshot().items()}
+    return {
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed > 0 else 0.0,
+        'posted': server.posts,
+        'synced': synced,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+        'requests': dict(server.requests, gemini={'calls': agent.model.calls},
+                         **{f'sheets.{method}': {'calls': calls}
+                            for method, calls in agent.service.values().calls.items()}),
+    }
+
+
+def _run_child(rows, options, conn):
+    try:
+        conn.send(run_size(rows, options))
+    except BaseException as e:
+        conn.send({'rows': rows, 'error': f'{type(e).__name__}: {e}'})
+    finally:
+        conn.close()
+
+
+def run_isolated(rows, options):
+    """Run one size in a fresh interpreter so peak RSS only covers that run"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_child, args=(rows, options, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'rows': rows, 'error': 'benchmark process exited without a result'}
+    process.join()
+    return result
+
+
+def print_result(result):
+    if 'error' in result:
+        print(f"\n{result['rows']} rows: FAILED ({result['error']})")
+        return
+    rss = f"{result['peak_rss_mb']:.1f} MB" if result['peak_rss_mb'] is not None else 'n/a'
+    print(f"\n{result['rows']} rows: {result['seconds']:.2f}s, {result['rows_per_sec']:.1f} rows/sec, "
+          f"{result['posted']} posted, {result['synced']} synced to sheet, peak RSS {rss}")
+    width = max([len(name) for name in result['stages']] + [5])
+    print(f"  {'stage':<{width}}  {'runs':>7}  {'errors':>6}  {'p50 ms':>8}  {'p99 ms':>8}")
+    for name, stage in result['stages'].items():
+        print(f"  {name:<{width}}  {stage['count']:>7}  {stage['errors']:>6}  "
+              f"{stage['p50_ms']:>8.1f}  {stage['p99_ms']:>8.1f}")
+    calls = ', '.join(f"{name} {stats['calls']}" for name, stats in sorted(result['requests'].items()))
+    print(f"  calls: {calls}")
+
+
+def find_regressions(results, baseline, tolerance, expect_clean):
+    """Compare results with a baseline run and return a list of regression messages"""
+    previous = {entry['rows']: entry for entry in baseline.get('results', []) if 'error' not in entry}
+    problems = []
+    for result in results:
+        rows = result['rows']
+        if 'error' in result:
+            problems.append(f"{rows} rows: benchmark failed: {result['error']}")
+            continue
+        if expect_clean and result['posted'] < rows:
+            problems.append(f"{rows} rows: only {result['posted']} posted without injected errors")
+        old = previous.get(rows)
+        if old is None:
+            continue
+        if result['rows_per_sec'] < old['rows_per_sec'] * (1 - tolerance):
+            problems.append(f"{rows} rows: throughput {result['rows_per_sec']:.1f} rows/sec, "
+                            f"baseline {old['rows_per_sec']:.1f}")
+        for name, stage in result['stages'].items():
+            old_stage = old['stages'].get(name)
+            if old_stage is None:
+                continue
+            if (stage['p99_ms'] > old_stage['p99_ms'] * (1 + tolerance)
+                    and stage['p99_ms'] - old_stage['p99_ms'] > MIN_P99_DELTA_MS):
+                problems.append(f"{rows} rows: {name} p99 {stage['p99_ms']:.1f} ms, "
+                                f"baseline {old_stage['p99_ms']:.1f} ms")
+        if result['peak_rss_mb'] and old.get('peak_rss_mb') and \
+                result['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            problems.append(f"{rows} rows: peak RSS {result['peak_rss_mb']:.1f} MB, "
+                            f"baseline {old['peak_rss_mb']:.1f} MB")
+    return problems
+
+
+def parse_service_values(values, option):
+    parsed = {}
+    for value in values or []:
+        service, _, number = value.partition('=')
+        if service not in SERVICES:
+            raise argparse.ArgumentTypeError(f"{option}: unknown service '{service}' (choose from {', '.join(SERVICES)})")
+        try:
+            parsed[service] = float(number)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{option}: '{value}' is not SERVICE=NUMBER")
+    return parsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the LinkedIn agent end to end against local fakes')
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROWS), metavar='N',
+                        help='sheet sizes to benchmark')
+    parser.add_argument('--latency', action='append', metavar='SERVICE=MS',
+                        help=f"simulated latency per call, repeatable ({', '.join(SERVICES)})")
+    parser.add_argument('--error-rate', action='append', metavar='SERVICE=RATE',
+                        help='fraction of calls to SERVICE that fail, repeatable')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for jitter and injected failures')
+    parser.add_argument('--pipeline', action='store_true', help='run rows through the concurrent pipeline')
+    parser.add_argument('--post-workers', type=int, default=linkedin_agent.PIPELINE_CONCURRENCY['post'], metavar='N',
+                        help='concurrent LinkedIn posts in pipeline mode')
+    parser.add_argument('--posts-per-minute', type=float, default=1e9, metavar='N',
+                        help='posting rate limit (unthrottled by default)')
+    parser.add_argument('--image-pool', type=int, default=0, metavar='N',
+                        help='number of distinct Unsplash photos to serve (0: a new photo per search result)')
+    parser.add_argument('--generate-batch', type=int, default=linkedin_agent.GENERATE_BATCH_SIZE, metavar='K',
+                        help='topics per Gemini request')
+    parser.add_argument('--cache', action='store_true', help='keep the content cache enabled')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR',
+                        type=str.upper, help='log level of the agent during the run')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='profile every stage and write pstats files and allocation diffs to DIR/<rows>-rows '
+                             '(slows the run down, so timings are not comparable)')
+    parser.add_argument('--output', metavar='FILE', help='write the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with the results of an earlier --output run')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, metavar='FRACTION',
+                        help='allowed slowdown or growth against the baseline')
+    args = parser.parse_args()
+    try:
+        args.latency = parse_service_values(args.latency, '--latency')
+        args.error_rate = parse_service_values(args.error_rate, '--error-rate')
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if any(n < 1 for n in args.rows) or args.post_workers < 1 or args.generate_batch < 1:
+        parser.error('--rows, --post-workers and --generate-batch must be positive integers')
+    return args
+
+
+def main():
+    args = parse_args()
+    options = {
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'seed': args.seed,
+        'pipeline': args.pipeline,
+        'post_workers': args.post_workers,
+        'posts_per_minute': args.posts_per_minute,
+        'image_pool': args.image_pool,
+        'generate_batch': args.generate_batch,
+        'cache': args.cache,
+        'log_level': args.log_level,
+        # Children run in a temporary directory
+        'profile': os.path.abspath(args.profile) if args.profile else None,
+    }
+    results = []
+    for rows in args.rows:
+        result = run_isolated(rows, options)
+        print_result(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'options': options, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    expect_clean = not any(args.error_rate.values())
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    problems = find_regressions(results, baseline, args.tolerance, expect_clean)
+    if problems:
+        print("\nRegressions:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    if args.baseline:
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
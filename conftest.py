@@ -0,0 +1,35 @@
+"""Fixtures running the agent against the benchmark's fake LinkedIn, Unsplash, Sheets and Gemini services."""
+import json
+import time
+
+import pytest
+
+import benchmark
+import linkedin_agent
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Job store, caches and token files
+    for name in ('GOOGLE_API_KEY', 'LINKEDIN_CLIENT_ID', 'LINKEDIN_CLIENT_SECRET', 'SPREADSHEET_ID',
+                 'UNSPLASH_ACCESS_KEY'):
+        monkeypatch.setenv(name, 'test')
+    with open(linkedin_agent.LINKEDIN_TOKEN_FILE, 'w') as f:
+        json.dump({'access_token': 'test', 'expires_at': time.time() + 3600, 'linkedin_id': 'test'}, f)
+    server = benchmark.FakeServer(benchmark.FaultInjector({}, {})).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_agent(server):
+    """Build agents wired to the fake services, reading and writing the given sheet rows"""
+    def make_agent(sheet, **options):
+        # Posts are not paced like the real API's, which would make multi-row tests wait seconds per post
+        options = {'use_cache': False, 'process_images': False, 'posts_per_minute': 6000, **options}
+        agent = linkedin_agent.LinkedInAgent(**options)
+        agent.http = benchmark.LocalHTTPSession(server.base_url)
+        agent.service = benchmark.FakeSheetsService(sheet, server.inject)
+        agent.model = benchmark.FakeGenerativeModel(server.inject)
+        return agent
+    return make_agent
@@ -1,90 +1,2024 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 import requests
-from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from io import BytesIO
 import time
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import pickle
+import datetime
 import sys
-import traceback
+import logging
 import json
-from requests_oauthlib import OAuth2Session
+import re
+import importlib
+import inspect
+import multiprocessing
 import webbrowser
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
 import threading
+import cProfile
+import tracemalloc
 import urllib.parse
+import argparse
+import asyncio
+import hashlib
+import heapq
+import random
+import unicodedata
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque, namedtuple
+
+logger = logging.getLogger('linkedin_agent')
+
+# Heavy client libraries (google.generativeai, googleapiclient, PIL,
+# requests_oauthlib) are imported where they are first used, so runs that
+# never touch a client do not pay for loading it.
 
 # Allow insecure transport for local development
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-class LinkedInAgent:
+# Credential storage. Tokens are refreshed in the background this long before
+# they expire; LinkedIn access tokens last 60 days, Google ones an hour.
+LINKEDIN_TOKEN_FILE = 'linkedin_token.json'
+GOOGLE_TOKEN_FILE = 'google_token.json'
+LINKEDIN_REFRESH_MARGIN = 24 * 3600  # seconds
+GOOGLE_REFRESH_MARGIN = 10 * 60  # seconds
+TOKEN_CHECK_INTERVAL = 60  # seconds
+LINKEDIN_AUTH_TIMEOUT = 5 * 60  # seconds to wait for the browser login
+
+# Stage latency histogram buckets (seconds) and how many raw samples per stage
+# are kept for percentiles
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_SAMPLE_SIZE = 10000
+# --metrics-port listens on this address only, unless --metrics-host says otherwise
+METRICS_HOST = '127.0.0.1'
+
+# --profile: allocations are traced during the first PROFILE_MEMORY_RUNS runs of
+# each stage and the top PROFILE_TOP allocation sites written per stage
+PROFILE_MEMORY_RUNS = 20
+PROFILE_TOP = 25
+PROFILE_TRACE_FRAMES = 1
+
+# Gemini model used for generation. Its metadata is cached on disk so the model
+# is only checked against the API when the cache is missing or stale.
+GEMINI_MODEL_NAME = 'models/gemini-1.5-pro'
+MODEL_CACHE_FILE = 'model_cache.json'
+MODEL_CACHE_TTL = 24 * 3600  # seconds
+
+# Gemini prices in USD per million tokens (gemini-1.5-pro, prompts up to 128k
+# tokens), used to report what a run cost. Requests can be paced against
+# requests and tokens per minute budgets; one Gemini still rejects for quota is
+# retried after GEMINI_RETRY_DELAY seconds, doubling each time.
+GEMINI_INPUT_PRICE = 1.25
+GEMINI_OUTPUT_PRICE = 5.00
+GEMINI_RETRY_DELAY = 5  # seconds
+GEMINI_MAX_RETRIES = 4
+
+# LinkedIn's post length budget. Generation is streamed and stopped once a
+# post reaches it, and max_output_tokens is derived from it (emoji-heavy posts
+# run at roughly three characters per token). Posts that run over are cut at
+# a sentence or hashtag boundary and tagged with POST_TRUNCATION_TAG, as are
+# shorter posts the model left unfinished on hitting max_output_tokens.
+POST_MAX_CHARS = 2500
+GENERATE_CHARS_PER_TOKEN = 3
+POST_MAX_TOKENS = POST_MAX_CHARS // GENERATE_CHARS_PER_TOKEN + 1
+POST_TRUNCATION_TAG = '#LinkedInPost'
+SENTENCE_END = re.compile(r'[.!?…](?=\s)|\n')
+
+# Opening emoji per topic keyword, in priority order, matched in one regex pass
+TOPIC_EMOJIS = (
+    ('technology', '🚀'),
+    ('marketing', '📊'),
+    ('ai', '🤖'),
+    ('machine learning', '🧠'),
+    ('cyber security', '🔒'),
+    ('network', '🌐'),
+    ('data', '📈'),
+    ('business', '💼'),
+    ('development', '💻'),
+    ('cloud', '☁️'),
+    ('blockchain', '⛓️'),
+    ('iot', '📱'),
+    ('automation', '⚙️'),
+    ('analytics', '📊'),
+    ('innovation', '💡'),
+)
+DEFAULT_TOPIC_EMOJI = '💡'
+# A lookahead reports every keyword present, including overlapping ones
+TOPIC_EMOJI_PATTERN = re.compile(
+    '(?=(' + '|'.join(re.escape(key) for key, _ in sorted(TOPIC_EMOJIS, key=lambda item: -len(item[0]))) + '))'
+)
+TOPIC_EMOJI_PRIORITY = {key: i for i, (key, _) in enumerate(TOPIC_EMOJIS)}
+
+# Near-duplicate topics: topics are normalized (case, punctuation, word order,
+# filler words, plurals) and compared by Jaccard similarity of character
+# trigrams, with MinHash signatures split into LSH bands to find candidates
+TOPIC_SIMILARITY_THRESHOLD = 0.7
+TOPIC_MINHASH_PERMUTATIONS = 32
+TOPIC_LSH_BANDS = 8
+TOPIC_BUCKET_SIZE = 16  # topics kept per LSH bucket, bounding comparisons on very uniform topic lists
+TOPIC_STOPWORDS = frozenset(['a', 'an', 'and', 'the', 'in', 'on', 'of', 'for', 'with', 'to', 'by', 'at',
+                             'from', 'into', 'about', 'using', 'vs', 'versus'])
+
+# Batched generation: topics per Gemini request (1 disables batching) and the
+# shortest post accepted from a batched response
+GENERATE_BATCH_SIZE = 1
+GENERATE_BATCH_MIN_CHARS = 100
+
+# Modules timed by --startup-benchmark
+STARTUP_BENCHMARK_MODULES = (
+    'google.generativeai',
+    'googleapiclient.discovery',
+    'google_auth_oauthlib.flow',
+    'google.auth.transport.requests',
+    'requests_oauthlib',
+    'PIL.Image',
+)
+
+# Posts are published through a token bucket to stay under LinkedIn's rate
+# limits: POSTS_PER_MINUTE sustained, with bursts of up to POST_BURST posts
+POSTS_PER_MINUTE = 12
+POST_BURST = 1
+
+# Daemon mode: seconds between cheap sheet polls, and how often rows that
+# failed earlier are retried even when the sheet has not changed
+DAEMON_POLL_INTERVAL = 60
+DAEMON_RETRY_INTERVAL = 15 * 60
+
+# Default worker count per pipeline stage and size of the queues between them.
+# Sheet writes stay serialized because the Sheets client is not thread-safe.
+PIPELINE_CONCURRENCY = {'generate': 2, 'image': 2, 'sheet': 1, 'post': 1}
+PIPELINE_QUEUE_SIZE = 4
+
+# On-disk cache for generated content, keyed by model name + prompt
+CONTENT_CACHE_PATH = 'content_cache.sqlite3'
+CONTENT_CACHE_TTL = 7 * 24 * 3600  # seconds
+CONTENT_CACHE_MAX_ENTRIES = 5000
+CONTENT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Shared HTTP session: connection pool size per host, (connect, read) timeout
+# in seconds and retry policy for 429/5xx responses
+HTTP_POOL_SIZES = {
+    'https://api.linkedin.com/': 10,
+    'https://www.linkedin.com/': 4,
+    'https://api.unsplash.com/': 4,
+    'https://images.unsplash.com/': 8,
+}
+HTTP_NON_IDEMPOTENT_PREFIXES = (
+    'https://api.linkedin.com/v2/ugcPosts',
+    'https://www.linkedin.com/oauth/v2/accessToken',
+)
+HTTP_TIMEOUT = (5, 60)
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Images are fitted inside LinkedIn's recommended feed size and re-encoded
+# in a process pool before upload
+IMAGE_MAX_SIZE = (1200, 1200)
+IMAGE_FORMAT = 'JPEG'
+IMAGE_QUALITY = 85
+IMAGE_WORKERS = 2
+# Image.info entries besides EXIF that count as metadata to strip
+IMAGE_METADATA_KEYS = ('icc_profile', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+# Unsplash search results are kept per topic for IMAGE_CACHE_TTL seconds, so
+# later rows and runs pick from the same candidates instead of calling the API
+IMAGE_CACHE_PATH = 'image_cache.sqlite3'
+IMAGE_CACHE_TTL = 7 * 24 * 3600
+IMAGE_SEARCH_PER_PAGE = 30  # the most Unsplash returns per search request
+
+# Index of uploaded LinkedIn image assets, so repeated images skip
+# registerUpload and the upload PUT. Entries are reused for ASSET_TTL seconds.
+ASSET_INDEX_PATH = 'asset_index.sqlite3'
+ASSET_TTL = 7 * 24 * 3600
+
+# Per-row job state, so an interrupted run resumes each row from its last
+# completed stage. Jobs untouched for JOB_RETENTION seconds are dropped.
+JOB_STORE_PATH = 'job_state.sqlite3'
+JOB_RETENTION = 30 * 24 * 3600
+JOB_STATES = ('new', 'generated', 'image_resolved', 'posted', 'synced')
+# Recent posts searched for a post whose ugcPosts call was interrupted
+POST_LOOKUP_COUNT = 50
+# Post id recorded by --mark-posted for a post confirmed by hand
+POST_ID_MANUAL = 'manual'
+
+# Row updates are buffered and written with one values.batchUpdate once this
+# many rows are pending or the oldest pending row is this many seconds old
+SHEET_WRITE_BATCH_ROWS = 25
+SHEET_WRITE_MAX_DELAY = 30
+
+# Column D holds a short status marker so pending rows can be found without
+# downloading the generated posts in column B. The cursor file remembers where
+# the first unfinished row is, so later runs only read rows from there on.
+SHEET_STATUS_COLUMN = 'D'
+SHEET_STATUS_DONE = 'done'
+SHEET_CURSOR_FILE = 'sheet_cursor.json'
+SHEET_READ_BATCH_RANGES = 200
+# The sheet is read in windows of this many rows, so memory does not grow with it
+SHEET_PAGE_ROWS = 1000
+
+# Optional column E holds a publish time (ISO 8601, local time unless an offset
+# is given). Such rows are generated and their images uploaded straight away
+# and posted when due; rows due further ahead than SCHEDULE_HORIZON seconds
+# are prepared but left pending for a later run. The column is read unformatted,
+# so a cell Sheets recognised as a date arrives as a serial number of days since
+# SHEET_DATE_EPOCH in the spreadsheet's time zone (assumed to be the local one).
+SHEET_PUBLISH_AT_COLUMN = 'E'
+SHEET_DATE_EPOCH = datetime.datetime(1899, 12, 30)
+SCHEDULE_HORIZON = 24 * 3600
+# Text formats accepted besides ISO 8601, as Sheets writes dates with unpadded hours
+PUBLISH_AT_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+# Local CSV/Parquet topic files are read this many rows at a time, and results
+# are appended to the output file in batches of LOCAL_WRITE_BATCH_ROWS rows
+TOPIC_CHUNK_ROWS = 1000
+LOCAL_WRITE_BATCH_ROWS = 500
+LOCAL_OUTPUT_COLUMNS = ('row', 'topic', 'content', 'image', 'status')
+
+def process_image(image_bytes, max_size=IMAGE_MAX_SIZE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """Downsize and re-encode an image for LinkedIn, dropping its metadata.
+
+    Runs in a worker process, so it only takes and returns plain picklable
+    values: (encoded bytes, original size, encoded size, encode seconds,
+    changed), where changed tells whether the image was resized or had
+    metadata, so the original must not be uploaded even if it is smaller.
+    """
+    from PIL import Image, ImageOps
+
+    start = time.perf_counter()
+    with Image.open(BytesIO(image_bytes)) as image:
+        had_metadata = bool(image.getexif()) or any(key in image.info for key in IMAGE_METADATA_KEYS)
+        original_size = image.size
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.thumbnail(max_size, Image.LANCZOS)
+        changed = had_metadata or image.size != original_size
+        output = BytesIO()
+        # Saving without exif/icc_profile strips the original metadata
+        image.save(output, format=image_format, quality=quality, optimize=True)
+    encoded = output.getvalue()
+    return encoded, len(image_bytes), len(encoded), time.perf_counter() - start, changed
+
+def parse_publish_at(value):
+    """Epoch seconds for a publish time cell (ISO 8601 or a Sheets date serial, local time unless an offset is given)"""
+    if isinstance(value, (int, float)):
+        return (SHEET_DATE_EPOCH + datetime.timedelta(days=value)).timestamp()
+    value = value.strip()
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        pass
+    for date_format in PUBLISH_AT_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"invalid publish time {value!r}, expected e.g. 2024-05-01 09:30")
+
+class JsonLogFormatter(logging.Formatter):
+    """Formats log records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+def configure_logging(level='INFO', json_format=False):
+    """Send the agent's logs to stdout as plain text or JSON lines"""
+    handler = logging.StreamHandler(sys.stdout)
+    if json_format:
+        handler.setFormatter(JsonLogFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(message)s'))
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+class StageTimer:
+    """Context manager that records one timed run of a stage; call fail() to count it as an error."""
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+    def __enter__(self):
+        if self.metrics.profiler is not None:
+            self.metrics.profiler.enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, error=self.failed or exc_type is not None)
+        if self.metrics.profiler is not None:
+            self.metrics.profiler.exit()
+        return False
+
+class StageProfiler:
+    """cProfile and tracemalloc collection around every run of a Metrics stage.
+
+    CPU time goes to one cProfile.Profile per stage and thread; a stage nested
+    in another pauses the outer stage's profile, so each pstats file only holds
+    its own stage. For the first memory_runs runs of each stage, allocations
+    are traced from entry to exit, one run at a time, recording what the run
+    left allocated per source line and its peak. With concurrent workers,
+    other threads' allocations in that window are counted too. write() saves
+    <stage>.pstats and <stage>.alloc.txt to output_dir.
+    """
+
+    def __init__(self, output_dir, cpu=True, memory=True, top=PROFILE_TOP, memory_runs=PROFILE_MEMORY_RUNS):
+        self.output_dir = output_dir
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.memory_runs = memory_runs
+        self.runs = {}
+        self.memory_samples = {}
+        self.peaks = {}
+        self.profiles = {}  # (stage, thread id) -> cProfile.Profile
+        self.allocations = {}  # stage -> {allocation site: [bytes, blocks]}
+        self.unprofiled = 0
+        self._tracing = False
+        # Leave out allocations made by the profiling itself
+        own_code = (StageTimer.__enter__, StageTimer.__exit__, self.enter, self.exit, self._enable)
+        lines = set()
+        for code in own_code:
+            source, first = inspect.getsourcelines(code)
+            lines.update(range(first, first + len(source)))
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__)] + [
+            tracemalloc.Filter(False, __file__, line) for line in sorted(lines)
+        ]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _enable(self, profile):
+        try:
+            profile.enable()
+            return profile
+        except ValueError:
+            # Python 3.12+ allows only one active profiler per process
+            with self._lock:
+                self.unprofiled += 1
+            return None
+
+    def enter(self, name):
+        stack = self._local.__dict__.setdefault('stack', [])
+        if stack and stack[-1][1] is not None:
+            stack[-1][1].disable()
+        with self._lock:
+            self.runs[name] = self.runs.get(name, 0) + 1
+            # Tracing restarts from scratch, so only one run can be traced at a time
+            trace = (self.memory and not self._tracing and not tracemalloc.is_tracing()
+                     and self.memory_samples.get(name, 0) < self.memory_runs)
+            if trace:
+                self._tracing = True
+                self.memory_samples[name] = self.memory_samples.get(name, 0) + 1
+            profile = None
+            if self.cpu:
+                key = (name, threading.get_ident())
+                profile = self.profiles.get(key)
+                if profile is None:
+                    profile = self.profiles[key] = cProfile.Profile()
+        if trace:
+            tracemalloc.start(PROFILE_TRACE_FRAMES)
+        if profile is not None:
+            profile = self._enable(profile)
+        stack.append([name, profile, trace])
+
+    def exit(self):
+        stack = self._local.stack
+        name, profile, trace = stack.pop()
+        if profile is not None:
+            profile.disable()
+        if trace:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            statistics = snapshot.filter_traces(self._filters).statistics('lineno')
+            with self._lock:
+                self._tracing = False
+                self.peaks[name] = max(self.peaks.get(name, 0), peak)
+                sites = self.allocations.setdefault(name, {})
+                for stat in statistics:
+                    site = sites.setdefault(str(stat.traceback), [0, 0])
+                    site[0] += stat.size
+                    site[1] += stat.count
+        if stack and stack[-1][1] is not None:
+            stack[-1][1] = self._enable(stack[-1][1])
+
+    def write(self):
+        """Write <stage>.pstats and <stage>.alloc.txt for every profiled stage; returns the stage names"""
+        import pstats
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self._lock:
+            profiles = list(self.profiles.items())
+            allocations = {name: sorted(sites.items(), key=lambda site: -site[1][0])
+                           for name, sites in self.allocations.items()}
+            runs = dict(self.runs)
+            samples = dict(self.memory_samples)
+            peaks = dict(self.peaks)
+
+        by_stage = {}
+        for (name, _), profile in profiles:
+            try:
+                stats = pstats.Stats(profile)
+            except TypeError:
+                continue  # Nothing recorded in this thread
+            if name in by_stage:
+                by_stage[name].add(stats)
+            else:
+                by_stage[name] = stats
+        for name, stats in by_stage.items():
+            stats.dump_stats(os.path.join(self.output_dir, f"{name}.pstats"))
+
+        for name, sites in allocations.items():
+            with open(os.path.join(self.output_dir, f"{name}.alloc.txt"), 'w') as f:
+                f.write(f"Memory still allocated at the end of {samples[name]} traced runs of {name} "
+                        f"(of {runs[name]}), top {self.top} sites by size; peak during one run "
+                        f"{peaks[name] / 1024:.1f} KiB\n")
+                for site, (size, count) in sites[:self.top]:
+                    f.write(f"{size / 1024:12.1f} KiB {count:9d} blocks  {site}\n")
+        return sorted(set(by_stage) | set(allocations))
+
+class Metrics:
+    """Thread-safe per-stage counts, errors and latency histograms.
+
+    Exported as Prometheus text (to_prometheus) or a JSON-ready dict
+    (snapshot), which also carries p50/p99 from recent raw samples.
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS, sample_size=METRICS_SAMPLE_SIZE):
+        self.buckets = tuple(buckets)
+        self.sample_size = sample_size
+        self._stages = {}
+        self._lock = threading.Lock()
+        # Optional StageProfiler wrapped around every stage
+        self.profiler = None
+
+    def stage(self, name):
+        """Time a block as one run of the named stage"""
+        return StageTimer(self, name)
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {
+                    'count': 0, 'errors': 0, 'sum': 0.0, 'max': 0.0,
+                    'buckets': [0] * len(self.buckets), 'samples': deque(maxlen=self.sample_size),
+                }
+            stage['count'] += 1
+            stage['errors'] += int(error)
+            stage['sum'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+            stage['samples'].append(seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stage['buckets'][i] += 1
+                    break
+
+    @staticmethod
+    def _percentile(samples, q):
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        """Return {stage: {count, errors, sum/mean/max/p50/p99 seconds, cumulative buckets}}"""
+        with self._lock:
+            stages = {name: dict(stage, samples=list(stage['samples']), buckets=list(stage['buckets']))
+                      for name, stage in self._stages.items()}
+        result = {}
+        for name, stage in sorted(stages.items()):
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets, stage['buckets']):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets['+Inf'] = stage['count']
+            result[name] = {
+                'count': stage['count'],
+                'errors': stage['errors'],
+                'sum_seconds': stage['sum'],
+                'mean_seconds': stage['sum'] / stage['count'] if stage['count'] else 0.0,
+                'max_seconds': stage['max'],
+                'p50_seconds': self._percentile(stage['samples'], 0.50),
+                'p99_seconds': self._percentile(stage['samples'], 0.99),
+                'buckets': buckets,
+            }
+        return result
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP linkedin_agent_stage_seconds Time spent in each pipeline stage.',
+            '# TYPE linkedin_agent_stage_seconds histogram',
+        ]
+        for name, stage in snapshot.items():
+            for bound, count in stage['buckets'].items():
+                lines.append(f'linkedin_agent_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'linkedin_agent_stage_seconds_sum{{stage="{name}"}} {stage["sum_seconds"]}')
+            lines.append(f'linkedin_agent_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        lines.append('# HELP linkedin_agent_stage_errors_total Failed runs of each pipeline stage.')
+        lines.append('# TYPE linkedin_agent_stage_errors_total counter')
+        for name, stage in snapshot.items():
+            lines.append(f'linkedin_agent_stage_errors_total{{stage="{name}"}} {stage["errors"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        """Write a JSON snapshot atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def log_summary(self):
+        for name, stage in self.snapshot().items():
+            logger.info(f"  {name}: {stage['count']} runs, {stage['errors']} errors, "
+                        f"p50 {stage['p50_seconds'] * 1000:.0f} ms, p99 {stage['p99_seconds'] * 1000:.0f} ms")
+
+def start_metrics_server(metrics, port, host=METRICS_HOST):
+    """Serve /metrics (Prometheus text) and /metrics.json on host:port from a background thread"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = metrics.to_prometheus().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body = json.dumps(metrics.snapshot()).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"Metrics request: {format % args}")
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"Serving metrics on http://{host or '0.0.0.0'}:{server.server_address[1]}/metrics")
+    return server
+
+def stamp_token_expiry(token, issued_at=None):
+    """Add absolute expires_at/refresh_token_expires_at times to a LinkedIn token response"""
+    if issued_at is None:
+        issued_at = time.time()
+    if 'expires_at' not in token and 'expires_in' in token:
+        token['expires_at'] = issued_at + token['expires_in']
+    if 'refresh_token_expires_at' not in token and 'refresh_token_expires_in' in token:
+        token['refresh_token_expires_at'] = issued_at + token['refresh_token_expires_in']
+    return token
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at rate per second up to capacity; acquire()
+    blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.waited += waited
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class GeminiBudget:
+    """Thread-safe pacing of Gemini requests against requests and tokens per minute.
+
+    acquire() reserves an estimated token count in a sliding one-minute window,
+    blocking while either budget is used up; record() corrects the reservation
+    once the real usage is known. After a quota error, backoff() pauses all
+    requests and halves the budgets, which recover gradually as requests succeed.
+    """
+
+    def __init__(self, rpm=None, tpm=None, window=60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.events = deque()  # [time, tokens] per request in the window
+        self.tokens = 0
+        self.throttled_seconds = 0.0
+        self.throttled_requests = 0
+        self.quota_errors = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.events and self.events[0][0] <= now - self.window:
+            event = self.events.popleft()
+            self.tokens -= event[1]
+            event[0] = None  # Marks the reservation as out of the window
+
+    def _delay(self, now, tokens):
+        """Seconds until a request of tokens fits in the budgets, 0 if it fits now"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rpm and len(self.events) >= max(1, int(self.rpm * self.scale)):
+            return self.events[0][0] + self.window - now
+        if self.tpm and self.events:
+            # A request larger than the whole budget still goes out on its own
+            budget = self.tpm * self.scale
+            if self.tokens + tokens > budget:
+                freed = self.tokens
+                for at, used in self.events:
+                    freed -= used
+                    if freed + tokens <= budget:
+                        return at + self.window - now
+                return self.events[-1][0] + self.window - now
+        return 0.0
+
+    def acquire(self, tokens):
+        """Reserve tokens for one request, sleeping until it fits; returns the reservation and seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                delay = self._delay(now, tokens)
+                if delay <= 0:
+                    event = [now, tokens]
+                    self.events.append(event)
+                    self.tokens += tokens
+                    if waited:
+                        self.throttled_seconds += waited
+                        self.throttled_requests += 1
+                    return event, waited
+            time.sleep(delay)
+            waited += delay
+
+    def record(self, event, tokens):
+        """Replace a reservation's estimate with the tokens the request actually used"""
+        with self._lock:
+            if event[0] is not None:
+                # Still in the window, so it counts towards the budget
+                self.tokens += tokens - event[1]
+            event[1] = tokens
+            self.scale = min(1.0, self.scale + 0.1)
+
+    def backoff(self, delay):
+        """Pause every request for delay seconds and tighten the budgets after a quota error"""
+        with self._lock:
+            self.quota_errors += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.scale = max(0.1, self.scale / 2)
+
+
+class GeminiUsage:
+    """Thread-safe per-run totals of Gemini calls, tokens and cost, with cost per topic"""
+
     def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.estimated = 0
+        self.cost = 0.0
+        self.topics = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def price(prompt_tokens, output_tokens):
+        return (prompt_tokens * GEMINI_INPUT_PRICE + output_tokens * GEMINI_OUTPUT_PRICE) / 1e6
+
+    def record(self, topics, prompt_tokens, output_tokens, estimated=False):
+        """Add one call's usage, splitting its cost evenly between the topics it generated"""
+        cost = self.price(prompt_tokens, output_tokens)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+            self.estimated += bool(estimated)
+            self.cost += cost
+            for topic in topics:
+                self.topics[topic] = self.topics.get(topic, 0.0) + cost / len(topics)
+        return cost
+
+    def most_expensive(self):
+        with self._lock:
+            if not self.topics:
+                return None, 0.0
+            return max(self.topics.items(), key=lambda item: item[1])
+
+
+class HTTPSession(requests.Session):
+    """Shared requests session with per-host connection pools, timeouts and retries.
+
+    Failed connections and 429/5xx responses are retried with exponential
+    backoff, honouring Retry-After. Endpoints that must not be replayed once
+    the server may have acted on them (creating a post, exchanging an auth
+    code) are only retried on 429 and connection errors.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT, max_retries=HTTP_MAX_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR):
+        super().__init__()
+        self.timeout = timeout
+        retry = self._make_retry(max_retries, backoff_factor, read=max_retries, status_forcelist=HTTP_RETRY_STATUSES)
+        once = self._make_retry(max_retries, backoff_factor, read=0, status_forcelist=(429,))
+        self.mount('https://', HTTPAdapter(max_retries=retry))
+        self.mount('http://', HTTPAdapter(max_retries=retry))
+        for prefix, pool_size in HTTP_POOL_SIZES.items():
+            self.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+        # Longest prefix wins, so these override the per-host adapters above
+        for prefix in HTTP_NON_IDEMPOTENT_PREFIXES:
+            self.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=once))
+
+    @staticmethod
+    def _make_retry(total, backoff_factor, read, status_forcelist):
+        return Retry(
+            total=total,
+            connect=total,
+            read=read,
+            status=total,
+            backoff_factor=backoff_factor,
+            status_forcelist=status_forcelist,
+            allowed_methods=frozenset(['GET', 'HEAD', 'PUT', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # Hand the last response back to the caller's status checks
+        )
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+class LinkedInAccount:
+    """A LinkedIn identity to publish as, with its own connection pool and posting budget."""
+
+    def __init__(self, name, token, owner, posts_per_minute=POSTS_PER_MINUTE, post_burst=POST_BURST,
+                 http=None, limiter=None, token_file=LINKEDIN_TOKEN_FILE):
+        self.name = name
+        self.token = token
+        self.token_file = token_file
+        self.owner = owner  # urn:li:person:... or urn:li:organization:...
+        self.http = http or HTTPSession()
+        self.limiter = limiter or TokenBucket(posts_per_minute / 60.0, post_burst)
+
+    def headers(self):
+        return {
+            'Authorization': f'Bearer {self.token["access_token"]}',
+            'Content-Type': 'application/json',
+            'X-Restli-Protocol-Version': '2.0.0'
+        }
+
+class TokenManager:
+    """Refreshes LinkedIn and Google credentials from a background thread before they expire.
+
+    Posting code only ever reads the current token; refreshes happen here,
+    ahead of expiry, so neither an interactive login nor a synchronous
+    refresh lands on the posting path. A token that cannot be refreshed is
+    reported once and left to expire.
+    """
+
+    def __init__(self, agent, check_interval=TOKEN_CHECK_INTERVAL):
+        self.agent = agent
+        self.check_interval = check_interval
+        self.refreshes = 0
+        self.failures = 0
+        self._warned = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='token-manager', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_due()
+            except Exception as e:
+                logger.exception(f"Error refreshing tokens: {e}")
+            self._stop.wait(self.check_interval)
+
+    def refresh_due(self):
+        """Refresh every credential that expires within its refresh margin"""
+        agent = self.agent
+        if agent.linkedin_token:
+            token = self._refresh_linkedin('default', agent.linkedin_token, LINKEDIN_TOKEN_FILE)
+            if token is not agent.linkedin_token:
+                agent.linkedin_token = token
+        for account in agent.accounts:
+            account.token = self._refresh_linkedin(account.name, account.token, account.token_file) or account.token
+
+        creds = getattr(agent, 'google_creds', None)
+        if creds is not None and creds.refresh_token and creds.expiry is not None:
+            # google-auth keeps expiry as a naive UTC datetime
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            remaining = (creds.expiry - now).total_seconds()
+            if remaining < GOOGLE_REFRESH_MARGIN:
+                from google.auth.transport.requests import Request
+                try:
+                    creds.refresh(Request())
+                    agent.save_google_credentials(creds)
+                    self.refreshes += 1
+                    logger.info("Google credentials refreshed")
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Error refreshing Google credentials: {e}")
+
+    def _refresh_linkedin(self, name, token, path):
+        remaining = token.get('expires_at', 0) - time.time()
+        if remaining >= LINKEDIN_REFRESH_MARGIN:
+            return token
+        if not token.get('refresh_token'):
+            if name not in self._warned:
+                self._warned.add(name)
+                logger.warning(f"LinkedIn token for {name} expires in {remaining / 3600:.1f}h and has no refresh token; "
+                               f"re-run the agent interactively to authorize again")
+            return token
+        refreshed = self.agent.refresh_linkedin_token(token, path)
+        if refreshed is None:
+            self.failures += 1
+            return token
+        self.refreshes += 1
+        return refreshed
+
+class SQLiteStore:
+    """Base for the on-disk state kept in a SQLite database.
+
+    One connection is shared between the pipeline and fan-out threads, and
+    every access to it is serialized by the lock. Pass ':memory:' as path to
+    keep the state for this process only.
+    """
+
+    def __init__(self, path, pragmas=()):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        for pragma in pragmas:
+            self._conn.execute(f'PRAGMA {pragma}')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class ContentCache(SQLiteStore):
+    """On-disk cache of generated post text keyed by model name and prompt.
+
+    Entries older than ttl are treated as misses. When the cache grows past
+    max_entries or max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=CONTENT_CACHE_PATH, ttl=CONTENT_CACHE_TTL,
+                 max_entries=CONTENT_CACHE_MAX_ENTRIES, max_bytes=CONTENT_CACHE_MAX_BYTES):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS content_cache ('
+            'key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS content_cache_accessed ON content_cache (accessed_at)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name, prompt):
+        """Hash the model name and rendered prompt into a cache key"""
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return cached content for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT content, created_at FROM content_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute('DELETE FROM content_cache WHERE key = ?', (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE content_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, content):
+        """Store content under key and evict old entries if the cache is over its limits"""
+        now = time.time()
+        size = len(content.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO content_cache (key, content, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)', (key, content, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        cursor = self._conn.execute('DELETE FROM content_cache WHERE created_at < ?', (now - self.ttl,))
+        self.evictions += cursor.rowcount
+        count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM content_cache').fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk entries from least to most recently used until back under both limits
+        doomed = []
+        for key, size in self._conn.execute('SELECT key, size FROM content_cache ORDER BY accessed_at'):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany('DELETE FROM content_cache WHERE key = ?', doomed)
+        self.evictions += len(doomed)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current cache size"""
+        with self._lock:
+            count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM content_cache').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': count,
+            'bytes': total,
+        }
+
+class SheetWriteBuffer:
+    """Write-behind buffer for row updates, flushed with values.batchUpdate.
+
+    Rows are sent once max_rows are pending or the oldest pending row is
+    older than max_delay seconds (checked as rows are added), and on an
+    explicit flush(). With verify enabled the written rows are read back in
+    a single values.batchGet after each flush.
+    """
+
+    def __init__(self, agent, max_rows=SHEET_WRITE_BATCH_ROWS, max_delay=SHEET_WRITE_MAX_DELAY, verify=False,
+                 on_written=None):
+        self.agent = agent
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.verify = verify
+        self.on_written = on_written
+        self.pending = {}
+        self.first_pending_at = None
+        self.flushes = 0
+        self.written = set()
+        self._lock = threading.Lock()
+
+    def add(self, row_index, content, image_url, status=SHEET_STATUS_DONE):
+        """Buffer an update for row_index, flushing if the buffer is full or stale"""
+        with self._lock:
+            if not self.pending:
+                self.first_pending_at = time.monotonic()
+            self.pending[row_index] = [content, image_url, status]
+            due = (len(self.pending) >= self.max_rows
+                   or time.monotonic() - self.first_pending_at >= self.max_delay)
+            if due:
+                return self._flush()
+            return True
+
+    def flush(self):
+        """Write all buffered rows, returning False if the batch failed"""
+        with self._lock:
+            return self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return True
+        rows = sorted(self.pending)
+        data = [{
+            'range': f'Sheet1!B{row_index + 1}:{SHEET_STATUS_COLUMN}{row_index + 1}',  # +1 because spreadsheet is 1-indexed
+            'values': [self.pending[row_index]],
+        } for row_index in rows]
+        try:
+            logger.info(f"Writing {len(rows)} row(s) to spreadsheet in one batch...")
+            with self.agent.metrics.stage('sheet_write'):
+                self.agent.service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=self.agent.spreadsheet_id,
+                    body={'valueInputOption': 'RAW', 'data': data}
+                ).execute()
+        except Exception as e:
+            logger.exception(f"Error writing rows {[r + 1 for r in rows]} to spreadsheet: {e}")
+            return False
+        self.pending = {}
+        self.first_pending_at = None
+        self.flushes += 1
+        self.written.update(rows)
+        logger.info(f"Successfully updated spreadsheet rows {[r + 1 for r in rows]}")
+        if self.on_written is not None:
+            self.on_written(rows)
+        if self.verify:
+            self._verify(rows)
+        return True
+
+    def _verify(self, rows):
         try:
-            print("Initializing LinkedIn Agent...")
+            with self.agent.metrics.stage('sheet_read'):
+                result = self.agent.service.spreadsheets().values().batchGet(
+                    spreadsheetId=self.agent.spreadsheet_id,
+                    ranges=[f'Sheet1!A{row_index + 1}:C{row_index + 1}' for row_index in rows]
+                ).execute()
+        except Exception as e:
+            logger.error(f"Error verifying spreadsheet update: {e}")
+            return
+        for row_index, value_range in zip(rows, result.get('valueRanges', [])):
+            updated_row = (value_range.get('values') or [[]])[0]
+            logger.debug(f"Updated row {row_index + 1} data:")
+            logger.debug(f"Topic: {updated_row[0] if updated_row else ''}")
+            logger.debug(f"Content: {updated_row[1][:100] if len(updated_row) > 1 else ''}...")  # Show first 100 chars of content
+            logger.debug(f"Image URL: {updated_row[2] if len(updated_row) > 2 else ''}")
+
+class ImageCache(SQLiteStore):
+    """On-disk pool of Unsplash image candidates per search query.
+
+    A search stores its image URLs under the query. take() hands out the
+    candidate that was used least recently, by this or any other query, so
+    repeated and similar topics rotate through their pool instead of getting
+    the same picture. Candidates older than ttl are dropped.
+    """
+
+    def __init__(self, path=IMAGE_CACHE_PATH, ttl=IMAGE_CACHE_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS image_candidates ('
+            'query TEXT NOT NULL, position INTEGER NOT NULL, image_url TEXT NOT NULL, fetched_at REAL NOT NULL, '
+            'PRIMARY KEY (query, position))'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS image_uses (image_url TEXT PRIMARY KEY, used_at REAL NOT NULL)'
+        )
+        cutoff = time.time() - ttl
+        self._conn.execute('DELETE FROM image_candidates WHERE fetched_at < ?', (cutoff,))
+        self._conn.execute('DELETE FROM image_uses WHERE used_at < ?', (cutoff,))
+        self._conn.commit()
+
+    def candidates(self, query):
+        """Image URLs still cached for query, in search order"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT image_url FROM image_candidates WHERE query = ? AND fetched_at >= ? ORDER BY position',
+                (query, time.time() - self.ttl)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def add(self, query, image_urls):
+        """Replace the candidates cached for query"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('DELETE FROM image_candidates WHERE query = ?', (query,))
+            self._conn.executemany(
+                'INSERT INTO image_candidates (query, position, image_url, fetched_at) VALUES (?, ?, ?, ?)',
+                [(query, position, image_url, now) for position, image_url in enumerate(image_urls)]
+            )
+            self._conn.commit()
+
+    def take(self, query):
+        """Return the least recently used candidate for query and mark it used, or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT c.image_url FROM image_candidates c LEFT JOIN image_uses u ON u.image_url = c.image_url '
+                'WHERE c.query = ? AND c.fetched_at >= ? ORDER BY COALESCE(u.used_at, 0), c.position LIMIT 1',
+                (query, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('INSERT OR REPLACE INTO image_uses (image_url, used_at) VALUES (?, ?)', (row[0], now))
+            self._conn.commit()
+        return row[0]
+
+class AssetIndex(SQLiteStore):
+    """On-disk index of uploaded LinkedIn image assets per owner.
+
+    Assets are found by source URL or by a hash of the downloaded image plus
+    the encoding settings, so an image LinkedIn already has is never
+    registered and uploaded again. Entries expire after ttl seconds, before
+    LinkedIn could stop accepting the asset in new posts.
+    """
+
+    def __init__(self, path=ASSET_INDEX_PATH, ttl=ASSET_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self.url_hits = 0
+        self.hash_hits = 0
+        self.misses = 0
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS image_assets ('
+            'owner TEXT NOT NULL, content_hash TEXT NOT NULL, source_url TEXT, asset TEXT NOT NULL, '
+            'uploaded_at REAL NOT NULL, PRIMARY KEY (owner, content_hash))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS image_assets_url ON image_assets (owner, source_url)')
+        self._conn.commit()
+
+    def _find(self, column, owner, value):
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT asset FROM image_assets WHERE owner = ? AND {column} = ? AND uploaded_at >= ? '
+                f'ORDER BY uploaded_at DESC LIMIT 1', (owner, value, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_by_url(self, owner, source_url):
+        """Return a still-valid asset uploaded for owner from source_url, or None"""
+        asset = self._find('source_url', owner, source_url)
+        if asset:
+            self.url_hits += 1
+        return asset
+
+    def find_by_hash(self, owner, content_hash):
+        """Return a still-valid asset uploaded for owner with the same image content, or None"""
+        asset = self._find('content_hash', owner, content_hash)
+        if asset:
+            self.hash_hits += 1
+        else:
+            self.misses += 1
+        return asset
+
+    def add(self, owner, content_hash, source_url, asset):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO image_assets (owner, content_hash, source_url, asset, uploaded_at) '
+                'VALUES (?, ?, ?, ?, ?)', (owner, content_hash, source_url, asset, time.time())
+            )
+            self._conn.execute('DELETE FROM image_assets WHERE uploaded_at < ?', (time.time() - self.ttl,))
+            self._conn.commit()
+
+    def discard(self, owner, asset):
+        """Forget an asset LinkedIn refused so the next post uploads the image again"""
+        with self._lock:
+            self._conn.execute('DELETE FROM image_assets WHERE owner = ? AND asset = ?', (owner, asset))
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.url_hits + self.hash_hits + self.misses
+        return {
+            'url_hits': self.url_hits,
+            'hash_hits': self.hash_hits,
+            'misses': self.misses,
+            'hit_rate': (self.url_hits + self.hash_hits) / lookups if lookups else 0.0,
+        }
+
+class Job:
+    """One row's progress through generation, image search, posting and the sheet update.
+
+    state is the last completed stage in JOB_STATES. posts maps an account
+    name to its uploaded 'asset' URN, the 'post_id' (x-restli-id) of the
+    published post and a 'state' of 'uploaded', 'posting' (ugcPosts was sent
+    but its outcome not recorded) or 'posted'. Every change is saved to the
+    store right away; a job without a store lives in memory only.
+    """
+
+    def __init__(self, store, source, row_index, topic, state='new', content=None, image_url=None, posts=None):
+        self.store = store
+        self.source = source
+        self.row_index = row_index
+        self.topic = topic
+        self.state = state
+        self.content = content
+        self.image_url = image_url
+        self.posts = posts or {}
+
+    def reached(self, state):
+        return JOB_STATES.index(self.state) >= JOB_STATES.index(state)
+
+    def advance(self, state, **fields):
+        """Record a completed stage along with its results"""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.state = state
+        if self.store is not None:
+            self.store.save(self)
+
+    def account(self, name):
+        return self.posts.get(name, {})
+
+    def update_account(self, name, **fields):
+        """Record upload or posting progress for one account"""
+        self.posts.setdefault(name, {'asset': None, 'post_id': None, 'state': None}).update(fields)
+        if self.store is not None:
+            self.store.save_post(self, name)
+
+    def claim_post(self, name, asset):
+        """Mark the account's post as in flight; False if another run has since posted or claimed it"""
+        if self.store is not None:
+            current = self.store.claim_post(self, name, self.account(name).get('state'), asset)
+            if current is not None:
+                self.posts[name] = current
+                return False
+        self.posts.setdefault(name, {'asset': None, 'post_id': None, 'state': None}).update(
+            asset=asset, state='posting')
+        return True
+
+    def refresh(self):
+        """Reload the post state of every account, which another run may have changed"""
+        if self.store is not None:
+            self.posts = self.store.posts(self)
+
+class JobStore(SQLiteStore):
+    """On-disk state of per-row jobs, so a restarted run skips the stages already done.
+
+    Jobs are keyed by topic source (spreadsheet or file) and row, and every
+    stage is committed as soon as it completes. The database runs in WAL mode
+    with full sync, so a crash never loses a recorded asset or post id. A job
+    is resumed while its row still has the same topic. Once the row is synced
+    the job is complete: if the row turns up as pending again (its content
+    was cleared to regenerate it) it starts over.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH, retention=JOB_RETENTION):
+        super().__init__(path, pragmas=('journal_mode=WAL', 'synchronous=FULL'))
+        self.retention = retention
+        self.stats = {'resumed': 0, 'generations': 0, 'images': 0, 'uploads': 0, 'posts': 0}
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'source TEXT NOT NULL, row_index INTEGER NOT NULL, topic TEXT NOT NULL, state TEXT NOT NULL, '
+            'content TEXT, image_url TEXT, updated_at REAL NOT NULL, PRIMARY KEY (source, row_index))'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_posts ('
+            'source TEXT NOT NULL, row_index INTEGER NOT NULL, account TEXT NOT NULL, asset TEXT, post_id TEXT, '
+            'state TEXT, updated_at REAL NOT NULL, PRIMARY KEY (source, row_index, account))'
+        )
+        cutoff = time.time() - retention
+        self._conn.execute('DELETE FROM jobs WHERE updated_at < ?', (cutoff,))
+        self._conn.execute('DELETE FROM job_posts WHERE updated_at < ?', (cutoff,))
+        self._conn.commit()
+
+    def _delete(self, source, row_index):
+        self._conn.execute('DELETE FROM jobs WHERE source = ? AND row_index = ?', (source, row_index))
+        self._conn.execute('DELETE FROM job_posts WHERE source = ? AND row_index = ?', (source, row_index))
+        self._conn.commit()
+
+    def load(self, source, row_index, topic):
+        """Return the job for a row, resuming it if an earlier run left it unfinished"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT topic, state, content, image_url FROM jobs WHERE source = ? AND row_index = ?',
+                (source, row_index)
+            ).fetchone()
+            if row is None:
+                return Job(self, source, row_index, topic)
+            if row[0] != topic or row[1] == 'synced':
+                self._delete(source, row_index)
+                return Job(self, source, row_index, topic)
+            posts = self._posts(source, row_index)
+            job = Job(self, source, row_index, topic, row[1], row[2], row[3], posts)
+            self.stats['resumed'] += 1
+            self.stats['generations'] += job.content is not None
+            self.stats['images'] += job.image_url is not None
+            self.stats['uploads'] += sum(1 for post in posts.values() if post['asset'])
+            self.stats['posts'] += sum(1 for post in posts.values() if post['post_id'])
+        logger.info(f"Resuming row {row_index + 1} ({topic}) after stage '{job.state}'")
+        return job
+
+    def _posts(self, source, row_index):
+        return {account: {'asset': asset, 'post_id': post_id, 'state': state}
+                for account, asset, post_id, state in self._conn.execute(
+                    'SELECT account, asset, post_id, state FROM job_posts WHERE source = ? AND row_index = ?',
+                    (source, row_index))}
+
+    def posts(self, job):
+        with self._lock:
+            return self._posts(job.source, job.row_index)
+
+    def claim_post(self, job, account, expected, asset):
+        """Set an account's post to 'posting' if its stored state is still expected and it has no post id
+
+        The check and the update run in one IMMEDIATE transaction, so of
+        several runs holding the same job only one gets to create the post.
+        Returns None once claimed, otherwise the stored post.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT asset, post_id, state FROM job_posts WHERE source = ? AND row_index = ? AND account = ?',
+                    (job.source, job.row_index, account)
+                ).fetchone()
+                current = dict(zip(('asset', 'post_id', 'state'), row or (None, None, None)))
+                if current['state'] != expected or current['post_id']:
+                    self._conn.rollback()
+                    return current
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO job_posts (source, row_index, account, asset, post_id, state, updated_at) '
+                    "VALUES (?, ?, ?, ?, NULL, 'posting', ?)",
+                    (job.source, job.row_index, account, asset, time.time())
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return None
+
+    def save(self, job):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO jobs (source, row_index, topic, state, content, image_url, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job.source, job.row_index, job.topic, job.state, job.content, job.image_url, time.time())
+            )
+            self._conn.commit()
+
+    def save_post(self, job, account):
+        post = job.posts[account]
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO job_posts (source, row_index, account, asset, post_id, state, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job.source, job.row_index, account, post['asset'], post['post_id'], post['state'], time.time())
+            )
+            self._conn.commit()
+
+    def resolve_posting(self, source, row_index, posted):
+        """Settle posts left 'posting' on a row: record them as published, or as not yet posted
+
+        Returns how many accounts were changed.
+        """
+        state, post_id = ('posted', POST_ID_MANUAL) if posted else ('uploaded', None)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_posts SET state = ?, post_id = ?, updated_at = ? "
+                "WHERE source = ? AND row_index = ? AND state = 'posting'",
+                (state, post_id, time.time(), source, row_index)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def mark_synced(self, source, rows):
+        """Complete the jobs of rows whose update has been written to the topic store"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'synced', updated_at = ? WHERE source = ? AND row_index = ?",
+                [(now, source, row_index) for row_index in rows]
+            )
+            self._conn.commit()
+
+class TopicIndex:
+    """Finds near-duplicate topics among the rows of a run.
+
+    Topics are reduced to a canonical form (sorted words without case,
+    punctuation, filler words or plural endings), so "AI in Marketing",
+    "ai in marketing " and "Marketing with AI" share one key. Topics that
+    still differ are compared by Jaccard similarity of their character
+    trigrams; MinHash signatures split into LSH bands keep that to a few
+    candidates per topic instead of a scan over every earlier topic. Topics
+    whose numbers differ ("Python 3.12" and "Python 3.13") are never near
+    duplicates, however similar the rest.
+    Signatures use numpy (installed with pandas) multiply-shift hashing.
+    """
+
+    def __init__(self, threshold=TOPIC_SIMILARITY_THRESHOLD, permutations=TOPIC_MINHASH_PERMUTATIONS,
+                 bands=TOPIC_LSH_BANDS, bucket_size=TOPIC_BUCKET_SIZE):
+        self.threshold = threshold
+        self.bucket_size = bucket_size
+        self.bands = bands
+        self.rows_per_band = permutations // bands
+        import numpy as np
+
+        rng = random.Random(0)
+        self._np = np
+        self._multipliers = np.array([rng.randrange(1, 1 << 64) | 1 for _ in range(permutations)], dtype=np.uint64)
+        self._offsets = np.array([rng.randrange(1 << 64) for _ in range(permutations)], dtype=np.uint64)
+        self.canonical = {}  # canonical topic -> first row index
+        self.buckets = {}  # band hash -> most recent row indices
+        self.topics = {}  # row index -> canonical topic, for representatives
+
+    @staticmethod
+    def normalize(topic):
+        """Canonical form of a topic: sorted distinct words, without filler words or plural endings"""
+        text = unicodedata.normalize('NFKC', topic).casefold()
+        words = set()
+        for word in re.findall(r'\w+', text):
+            if word in TOPIC_STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+                word = word[:-1]
+            words.add(word)
+        return ' '.join(sorted(words)) or ' '.join(text.split())
+
+    @staticmethod
+    def shingles(canonical):
+        padded = f" {canonical} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _band_keys(self, shingles):
+        np = self._np
+        hashes = np.fromiter((hash(shingle) & 0xFFFFFFFFFFFFFFFF for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        # One multiply-shift hash per permutation; uint64 arithmetic wraps around
+        products = self._multipliers[:, None] * hashes[None, :] + self._offsets[:, None]
+        signature = (products >> np.uint64(32)).min(axis=1)
+        size = self.rows_per_band
+        return [hash((band, signature[band * size:(band + 1) * size].tobytes())) for band in range(self.bands)]
+
+    def add(self, row_index, topic):
+        """Index a topic; returns (row_index, similarity) of an earlier near-duplicate, or None"""
+        canonical = self.normalize(topic)
+        if canonical in self.canonical:
+            return self.canonical[canonical], 1.0
+        shingles = self.shingles(canonical)
+        keys = self._band_keys(shingles) if shingles else []
+
+        numbers = sorted(re.findall(r'\d+', canonical))
+        best = None
+        for candidate in dict.fromkeys(row for key in keys for row in self.buckets.get(key, ())):
+            if sorted(re.findall(r'\d+', self.topics[candidate])) != numbers:
+                continue
+            other = self.shingles(self.topics[candidate])
+            similarity = len(shingles & other) / len(shingles | other)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        if best is not None:
+            return best
+
+        self.canonical[canonical] = row_index
+        self.topics[row_index] = canonical
+        for key in keys:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = bucket = deque(maxlen=self.bucket_size)
+            bucket.append(row_index)
+        return None
+
+class SheetRow(namedtuple('SheetRow', ('row_index', 'topic', 'status', 'publish_at'))):
+    """One spreadsheet row. row_index is 0-based and counts the header, as everywhere in the agent"""
+
+    __slots__ = ()
+
+    @property
+    def row_number(self):
+        """Row number as shown in the sheet"""
+        return self.row_index + 1
+
+class TopicStore(ABC):
+    """Where topics are read from and where generated posts are written.
+
+    open() connects to the backend, pending_chunks() yields lists of
+    (row_index, topic) pairs that still need content, write() records a
+    generated row, flush() pushes buffered writes out and finish() is called
+    once a run has gone through the pending rows. source identifies the
+    spreadsheet or file in the job store, and publish_at() returns the
+    publish time of a pending row in epoch seconds, if it has one.
+    """
+
+    source = None
+
+    def publish_at(self, row_index):
+        return None
+
+    def open(self):
+        pass
+
+    @abstractmethod
+    def pending_chunks(self, full_scan=False):
+        pass
+
+    @abstractmethod
+    def write(self, row_index, content, image_url, status=SHEET_STATUS_DONE):
+        pass
+
+    def flush(self):
+        return True
+
+    def finish(self):
+        pass
+
+class SheetTopicStore(TopicStore):
+    """Google Sheets backend: one chunk from the cursor scan, writes batched by the agent's SheetWriteBuffer"""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.source = f"sheet:{agent.spreadsheet_id}"
+        self.pending = set()
+        self.publish_times = {}
+        self.end = None
+
+    def open(self):
+        self.agent.get_google_sheets_service()
+
+    def pending_chunks(self, full_scan=False):
+        """Yield the pending rows of each page read from the sheet"""
+        self.pending = set()
+        self.end = None
+        for rows, skipped, end in self.agent.find_pending_rows(full_scan=full_scan):
+            self.end = end
+            # Rows with an invalid publish time are unfinished too: the cursor must not pass them,
+            # so they are picked up once fixed
+            self.pending.update(skipped)
+            if rows:
+                self.pending.update(row.row_index for row in rows)
+                self.publish_times.update((row.row_index, parse_publish_at(row.publish_at))
+                                          for row in rows if row.publish_at)
+                yield [(row.row_index, row.topic) for row in rows]
+
+    def publish_at(self, row_index):
+        return self.publish_times.get(row_index)
+
+    def write(self, row_index, content, image_url, status=SHEET_STATUS_DONE):
+        self.publish_times.pop(row_index, None)
+        return self.agent.update_spreadsheet_row(row_index, content, image_url, status)
+
+    def flush(self):
+        return self.agent.sheet_writer.flush()
+
+    def finish(self):
+        if self.end is None:
+            return
+        # Everything before the first row that still lacks content is done
+        remaining = self.pending - self.agent.sheet_writer.written
+        self.agent.save_sheet_cursor(min(remaining) if remaining else self.end)
+
+class LocalTopicStore(TopicStore):
+    """CSV or Parquet backend for bulk offline runs.
+
+    The input needs a 'topic' column; rows with a non-empty 'content' column
+    are skipped and an optional 'publish_at' column schedules rows. It is read TOPIC_CHUNK_ROWS rows at a time and results are
+    appended to the output every LOCAL_WRITE_BATCH_ROWS rows (one CSV append
+    or Parquet row group per batch), so memory stays flat however large the
+    file is. Rows already in the output are skipped, which lets an
+    interrupted run carry on where it stopped. Row numbers count the header
+    line, as in the sheet. Each file's format follows its extension.
+
+    Parquet output is written to a temporary file and moved into place by
+    finish(), since a Parquet file is only readable once it is closed.
+    on_written is called with the row indices of every batch once it is in
+    the output file.
+    """
+
+    def __init__(self, input_path, output_path=None, chunk_rows=TOPIC_CHUNK_ROWS,
+                 batch_rows=LOCAL_WRITE_BATCH_ROWS, on_written=None):
+        self.input_path = input_path
+        self.source = f"file:{os.path.abspath(input_path)}"
+        self.on_written = on_written
+        self.output_path = output_path or self.default_output_path(input_path)
+        if os.path.abspath(self.output_path) == os.path.abspath(input_path):
+            raise ValueError("The output file must differ from the topics file")
+        self.chunk_rows = chunk_rows
+        self.batch_rows = batch_rows
+        self.written = 0
+        self._topics = {}
+        self._publish_times = {}
+        self._buffer = []
+        self._writer = None
+        self._unpublished = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def default_output_path(input_path):
+        root, ext = os.path.splitext(input_path)
+        return f"{root}_posts{ext}"
+
+    @staticmethod
+    def is_parquet(path):
+        return path.lower().endswith(('.parquet', '.pq'))
+
+    @staticmethod
+    def _parquet():
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Parquet files need pyarrow (pip install pyarrow)")
+        return pyarrow, pyarrow.parquet
+
+    def _columns(self, path):
+        if self.is_parquet(path):
+            return self._parquet()[1].ParquetFile(path).schema_arrow.names
+        import pandas as pd
+        return list(pd.read_csv(path, nrows=0).columns)
+
+    def _read_chunks(self, path, columns):
+        """Yield DataFrames of up to chunk_rows rows holding the wanted columns present in path"""
+        import pandas as pd
+
+        available = self._columns(path)
+        columns = [column for column in columns if column in available]
+        if self.is_parquet(path):
+            parquet_file = self._parquet()[1].ParquetFile(path)
+            for batch in parquet_file.iter_batches(batch_size=self.chunk_rows, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False,
+                                   chunksize=self.chunk_rows)
+
+    def open(self):
+        if 'topic' not in self._columns(self.input_path):
+            raise ValueError(f"{self.input_path} has no 'topic' column")
+        logger.info(f"Reading topics from {self.input_path}, writing results to {self.output_path}")
+
+    def _done_rows(self):
+        """Row numbers already present in the output file"""
+        done = set()
+        if os.path.exists(self.output_path) and os.path.getsize(self.output_path):
+            for frame in self._read_chunks(self.output_path, ('row',)):
+                done.update(int(row) for row in frame['row'])
+        return done
+
+    def pending_chunks(self, full_scan=False):
+        done = self._done_rows()
+        if done:
+            logger.info(f"Skipping {len(done)} rows already in {self.output_path}")
+        row_index = 1
+        for frame in self._read_chunks(self.input_path, ('topic', 'content', 'publish_at')):
+            topics = frame['topic'].fillna('').astype(str)
+            contents = frame['content'].fillna('').astype(str) if 'content' in frame.columns else None
+            publish_times = frame['publish_at'].fillna('').astype(str) if 'publish_at' in frame.columns else None
+            chunk = []
+            for offset, topic in enumerate(topics):
+                index = row_index + offset
+                if index + 1 in done or (contents is not None and contents.iat[offset].strip()):
+                    continue
+                topic = topic.strip()
+                if not topic:
+                    logger.warning(f"Skipping row {index + 1}: topic name is missing")
+                    continue
+                publish_at = publish_times.iat[offset].strip() if publish_times is not None else ''
+                if publish_at:
+                    try:
+                        self._publish_times[index] = parse_publish_at(publish_at)
+                    except ValueError as e:
+                        logger.warning(f"Skipping row {index + 1}: {e}")
+                        continue
+                chunk.append((index, topic))
+            row_index += len(frame)
+            if chunk:
+                # Kept until written, as scheduled rows are written after later chunks
+                self._topics.update(chunk)
+                yield chunk
+
+    def publish_at(self, row_index):
+        return self._publish_times.get(row_index)
+
+    def write(self, row_index, content, image_url, status=SHEET_STATUS_DONE):
+        with self._lock:
+            self._publish_times.pop(row_index, None)
+            self._buffer.append((row_index + 1, self._topics.pop(row_index, ''), content, image_url, status))
+            if len(self._buffer) >= self.batch_rows:
+                return self._flush()
+            return True
+
+    def flush(self):
+        with self._lock:
+            return self._flush()
+
+    def _open_parquet_writer(self):
+        """Start the temporary Parquet output, copying over rows from an earlier run"""
+        pa, pq = self._parquet()
+        schema = pa.schema([('row', pa.int64()), ('topic', pa.string()), ('content', pa.string()),
+                            ('image', pa.string()), ('status', pa.string())])
+        writer = pq.ParquetWriter(f"{self.output_path}.tmp", schema)
+        if os.path.exists(self.output_path):
+            for batch in pq.ParquetFile(self.output_path).iter_batches(batch_size=self.batch_rows):
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        return writer
+
+    def _flush(self):
+        if not self._buffer:
+            return True
+        import pandas as pd
+
+        frame = pd.DataFrame(self._buffer, columns=list(LOCAL_OUTPUT_COLUMNS))
+        try:
+            logger.info(f"Writing {len(frame)} row(s) to {self.output_path}...")
+            if self.is_parquet(self.output_path):
+                if self._writer is None:
+                    self._writer = self._open_parquet_writer()
+                pa = self._parquet()[0]
+                self._writer.write_table(pa.Table.from_pandas(frame, schema=self._writer.schema, preserve_index=False))
+            else:
+                header = not os.path.exists(self.output_path) or not os.path.getsize(self.output_path)
+                frame.to_csv(self.output_path, mode='a', header=header, index=False)
+        except Exception as e:
+            logger.exception(f"Error writing rows to {self.output_path}: {e}")
+            return False
+        self.written += len(self._buffer)
+        rows = [entry[0] - 1 for entry in self._buffer]
+        self._buffer = []
+        if self._writer is not None:
+            # Parquet rows only count as written once finish() has moved the file into place
+            self._unpublished.extend(rows)
+        elif self.on_written is not None:
+            self.on_written(rows)
+        return True
+
+    def finish(self):
+        with self._lock:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                os.replace(f"{self.output_path}.tmp", self.output_path)
+                if self.on_written is not None:
+                    self.on_written(self._unpublished)
+                self._unpublished = []
+        logger.info(f"Wrote {self.written} row(s) to {self.output_path}")
+
+class PublishScheduler:
+    """Min-heap of prepared posts ordered by publish time.
+
+    Jobs are added once their content is generated and their images are
+    uploaded, so when a post falls due only the ugcPosts call is left.
+    publish_due() publishes every post whose time has come and wait() blocks
+    until the heap is empty. How late each post went live is logged and
+    recorded as the publish_lateness metric.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.published = 0
+        self.failed = []
+        self._heap = []
+        self._rows = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, job, due):
+        """Schedule a prepared job; False if its row is already waiting"""
+        with self._lock:
+            if job.row_index in self._rows:
+                return False
+            self._rows.add(job.row_index)
+            heapq.heappush(self._heap, (due, job.row_index, job))
+        return True
+
+    def next_due(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def publish_due(self):
+        """Publish every post that is due, returning how many were attempted"""
+        attempted = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > time.time():
+                    break
+                due, row_index, job = heapq.heappop(self._heap)
+                self._rows.discard(row_index)
+            attempted += 1
+            try:
+                success = self.agent.publish_scheduled(job, due)
+            except Exception as e:
+                logger.exception(f"Error publishing scheduled row {row_index + 1} ({job.topic}): {str(e)}")
+                success = False
+            if success:
+                self.published += 1
+            else:
+                self.failed.append(row_index + 1)
+        if attempted:
+            self.agent.topic_store.flush()
+        return attempted
+
+    def wait(self):
+        """Sleep until each scheduled post is due and publish it, until none are left"""
+        while True:
+            due = self.next_due()
+            if due is None:
+                return
+            delay = due - time.time()
+            if delay > 0:
+                logger.info(f"Next scheduled post is due in {delay:.0f}s ({len(self)} waiting)")
+                time.sleep(delay)
+            self.publish_due()
+
+class LinkedInAgent:
+    def __init__(self, use_cache=True, process_images=True, image_format=IMAGE_FORMAT, image_quality=IMAGE_QUALITY,
+                 verify_writes=False, posts_per_minute=POSTS_PER_MINUTE, post_burst=POST_BURST,
+                 accounts_file=None, reuse_assets=True, metrics_file=None, topics_file=None, topics_output=None,
+                 publish_posts=True, generate_batch_size=GENERATE_BATCH_SIZE, dedupe='flag',
+                 dedupe_threshold=TOPIC_SIMILARITY_THRESHOLD, resume_jobs=True, keep_image_cache=True,
+                 schedule_horizon=SCHEDULE_HORIZON, gemini_rpm=None, gemini_tpm=None, profiler=None):
+        try:
+            logger.info("Initializing LinkedIn Agent...")
             load_dotenv()
+
+            # Per-stage timings, optionally written to metrics_file as JSON after each run
+            self.metrics = Metrics()
+            self.metrics_file = metrics_file
+            # With --profile, every stage is also CPU and memory profiled
+            self.metrics.profiler = profiler
             
             # Verify environment variables
             self.api_key = os.getenv('GOOGLE_API_KEY')
-            print(f"GOOGLE_API_KEY found: {bool(self.api_key)}")
+            logger.info(f"GOOGLE_API_KEY found: {bool(self.api_key)}")
             
             # LinkedIn OAuth2 credentials
             self.linkedin_client_id = os.getenv('LINKEDIN_CLIENT_ID')
             self.linkedin_client_secret = os.getenv('LINKEDIN_CLIENT_SECRET')
             self.redirect_uri = 'http://localhost:8080/callback'  # Using HTTP for local development
-            print(f"LINKEDIN OAuth credentials found: {bool(self.linkedin_client_id and self.linkedin_client_secret)}")
+            logger.info(f"LINKEDIN OAuth credentials found: {bool(self.linkedin_client_id and self.linkedin_client_secret)}")
             
             self.spreadsheet_id = os.getenv('SPREADSHEET_ID')
-            print(f"SPREADSHEET_ID found: {bool(self.spreadsheet_id)}")
+            logger.info(f"SPREADSHEET_ID found: {bool(self.spreadsheet_id)}")
             
-            if not all([self.api_key, self.linkedin_client_id, self.linkedin_client_secret, self.spreadsheet_id]):
+            # The sheet is only needed without a topics file, LinkedIn only when posting
+            required = [self.api_key]
+            if publish_posts:
+                required += [self.linkedin_client_id, self.linkedin_client_secret]
+            if not topics_file:
+                required.append(self.spreadsheet_id)
+            if not all(required):
                 raise ValueError("Missing required environment variables")
             
-            print("Configuring Gemini...")
-            genai.configure(api_key=self.api_key)
-            
-            # List available models
-            print("Available models:")
-            for model in genai.list_models():
-                print(f"- {model.name}")
-            
-            # Use the correct model name from available models
-            model_name = 'models/gemini-1.5-pro'
-            self.model = genai.GenerativeModel(model_name)
-            print(f"Using model: {model_name}")
+            # The Gemini client is configured and the model checked on first use
+            self.model_name = GEMINI_MODEL_NAME
+            self.model_info = None
+            self._model = None
+            self._model_lock = threading.Lock()
+            self.content_cache = ContentCache() if use_cache else None
+            # Batched generation fills pregenerated ahead of generate_content
+            self.generate_batch_size = generate_batch_size
+            self.pregenerated = {}
+            self.generate_stats = {'batch_requests': 0, 'batched_topics': 0, 'fallbacks': 0}
+            self._generate_stats_lock = threading.Lock()
+            # Gemini requests are paced against optional per-minute budgets and their token usage recorded
+            self.gemini_budget = GeminiBudget(gemini_rpm, gemini_tpm)
+            self.gemini_usage = GeminiUsage()
+            # Near-duplicate topics in a batch are 'flag'ged, 'merge'd into their first row, or left alone ('off')
+            self.dedupe = dedupe
+            self.dedupe_threshold = dedupe_threshold
+            self.duplicates = 0
+            # With 'merge', a duplicate row is only marked once its original row is done
+            self.merged = {}  # original row index -> duplicate row indices
+            self.completed = set()
+            self._merge_lock = threading.Lock()
             
+            # Pooled HTTP session shared by all LinkedIn, Unsplash and OAuth calls
+            self.http = HTTPSession()
+            self.posts_per_minute = posts_per_minute
+            self.post_burst = post_burst
+            self.post_limiter = TokenBucket(posts_per_minute / 60.0, post_burst)
+
+            # Image re-encoding settings, the process pool is started on first use
+            self.process_images = process_images
+            self.image_format = image_format
+            self.image_quality = image_quality
+            self.image_pool = None
+            self.asset_index = AssetIndex() if reuse_assets else None
+            # Unsplash candidates, kept in memory for this run only without keep_image_cache
+            self.image_cache = ImageCache() if keep_image_cache else ImageCache(':memory:')
+            self.image_topics = None  # TopicIndex of searched topics, built on first use
+            self.image_queries = {}
+            self.unsplash_stats = {'images': 0, 'calls': 0, 'cached': 0, 'shared': 0}
+            self._unsplash_lock = threading.Lock()
+            self.image_stats = {'images': 0, 'bytes_in': 0, 'bytes_out': 0, 'encode_seconds': 0.0}
+            self._image_stats_lock = threading.Lock()
+
             # Initialize LinkedIn connection
-            print("Initializing LinkedIn connection...")
-            self.linkedin_token = self.load_linkedin_token()
-            if not self.linkedin_token:
-                self.linkedin_token = self.get_linkedin_token()
+            self.publish_posts = publish_posts
+            self.linkedin_token = None
+            if publish_posts and not accounts_file:
+                # With an accounts file every post goes through its accounts, so the default token is not needed
+                logger.info("Initializing LinkedIn connection...")
+                self.linkedin_token = self.load_linkedin_token()
+                if not self.linkedin_token:
+                    self.linkedin_token = self.get_linkedin_token()
+
+            # Optional fan-out to several member/company accounts
+            self.accounts = self.load_linkedin_accounts(accounts_file) if accounts_file else []
+            self.account_stats = {}
+            self._account_stats_lock = threading.Lock()
+            self.google_creds = None
+            self.token_manager = TokenManager(self)
             
             self.service = None
-            print("Initialization successful!")
+            # Per-row progress, so an interrupted run picks each row up where it stopped
+            self.jobs = JobStore() if resume_jobs else None
+            # Rows with a publish time are prepared ahead and posted by the scheduler when due
+            self.scheduler = PublishScheduler(self)
+            self.schedule_horizon = schedule_horizon
+            # Only daemon mode and --wait-for-schedule keep posts due within the horizon in this
+            # process; otherwise they are prepared and left pending for a run once they are due
+            self.hold_scheduled = False
+            self.deferred = 0
+            self.sheet_writer = SheetWriteBuffer(self, verify=verify_writes, on_written=self.mark_synced)
+            # Topics come from the Google Sheet unless a local CSV/Parquet file is given
+            if topics_file:
+                self.topic_store = LocalTopicStore(topics_file, topics_output, on_written=self.mark_synced)
+            else:
+                self.topic_store = SheetTopicStore(self)
+            logger.info("Initialization successful!")
             
         except Exception as e:
-            print(f"Error during initialization: {e}")
-            print("Traceback:")
-            traceback.print_exc()
+            logger.exception(f"Error during initialization: {e}")
             sys.exit(1)
 
+    @property
+    def model(self):
+        """Gemini model, configured and checked the first time it is needed"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.load_model()
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
+    def load_model(self):
+        """Configure Gemini and build the generative model, using cached model metadata when fresh"""
+        import google.generativeai as genai
+
+        logger.info("Configuring Gemini...")
+        genai.configure(api_key=self.api_key)
+
+        cache = {}
+        try:
+            if os.path.exists(MODEL_CACHE_FILE):
+                with open(MODEL_CACHE_FILE, 'r') as f:
+                    cache = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading model cache: {str(e)}")
+
+        info = cache.get(self.model_name)
+        if not info or time.time() - info.get('checked_at', 0) > MODEL_CACHE_TTL:
+            # One lookup for the configured model instead of listing every model
+            logger.info(f"Checking model {self.model_name}...")
+            model = genai.get_model(self.model_name)
+            info = {
+                'checked_at': time.time(),
+                'input_token_limit': getattr(model, 'input_token_limit', None),
+                'output_token_limit': getattr(model, 'output_token_limit', None),
+            }
+            cache[self.model_name] = info
+            try:
+                with open(MODEL_CACHE_FILE, 'w') as f:
+                    json.dump(cache, f)
+            except Exception as e:
+                logger.error(f"Error saving model cache: {str(e)}")
+        self.model_info = info
+
+        logger.info(f"Using model: {self.model_name}")
+        return genai.GenerativeModel(self.model_name)
+
     def get_linkedin_token(self):
         """Get LinkedIn OAuth2 token."""
+        server = None
         try:
-            print("\nStarting LinkedIn authentication process...")
-            print(f"Client ID: {self.linkedin_client_id}")
-            print(f"Redirect URI: {self.redirect_uri}")
+            logger.info("Starting LinkedIn authentication process...")
+            logger.debug(f"Client ID: {self.linkedin_client_id}")
+            logger.debug(f"Redirect URI: {self.redirect_uri}")
             
             # Verify client credentials
             if not self.linkedin_client_id or not self.linkedin_client_secret:
-                print("Error: LinkedIn client credentials are missing")
-                print("Please check your .env file and ensure LINKEDIN_CLIENT_ID and LINKEDIN_CLIENT_SECRET are set")
+                logger.error("Error: LinkedIn client credentials are missing")
+                logger.warning("Please check your .env file and ensure LINKEDIN_CLIENT_ID and LINKEDIN_CLIENT_SECRET are set")
                 return None
 
+            from requests_oauthlib import OAuth2Session
+
             # Define the OAuth2 session with required scopes
             oauth = OAuth2Session(
                 client_id=self.linkedin_client_id,
@@ -95,15 +2029,15 @@ class LinkedInAgent:
             # Create a simple HTTP server to handle the callback
             class CallbackHandler(BaseHTTPRequestHandler):
                 def do_GET(self):
-                    print(f"\nReceived callback request: {self.path}")
+                    logger.info(f"Received callback request: {self.path}")
                     if self.path.startswith('/callback'):
                         query = urllib.parse.urlparse(self.path).query
                         params = urllib.parse.parse_qs(query)
-                        print(f"Callback parameters: {params}")
+                        logger.debug(f"Callback parameters: {params}")
                         
                         if 'code' in params:
                             self.server.auth_code = params['code'][0]
-                            print("Authorization code received successfully")
+                            logger.info("Authorization code received successfully")
                             self.send_response(200)
                             self.send_header('Content-type', 'text/html')
                             self.end_headers()
@@ -111,36 +2045,37 @@ class LinkedInAgent:
                         elif 'error' in params:
                             error = params['error'][0]
                             error_description = params.get('error_description', [''])[0]
-                            print(f"\nAuthorization error: {error}")
-                            print(f"Error description: {error_description}")
+                            logger.error(f"Authorization error: {error}")
+                            logger.error(f"Error description: {error_description}")
                             if error == 'access_denied':
-                                print("\nYou denied access to the application. Please try again and authorize the application.")
+                                logger.warning("You denied access to the application. Please try again and authorize the application.")
                             elif error == 'invalid_scope':
-                                print("\nInvalid scope requested. Please check your LinkedIn app settings.")
+                                logger.warning("Invalid scope requested. Please check your LinkedIn app settings.")
                             self.send_response(400)
                             self.send_header('Content-type', 'text/html')
                             self.end_headers()
                             self.wfile.write(b'Authentication failed! Please check the console for details.')
                         else:
-                            print("\nNo authorization code or error received in callback")
+                            logger.warning("No authorization code or error received in callback")
                             self.send_response(400)
                             self.send_header('Content-type', 'text/html')
                             self.end_headers()
                             self.wfile.write(b'Authentication failed!')
                     else:
-                        print(f"\nInvalid callback path: {self.path}")
+                        logger.warning(f"Invalid callback path: {self.path}")
                         self.send_response(404)
                         self.send_header('Content-type', 'text/html')
                         self.end_headers()
                         self.wfile.write(b'Not found')
 
             # Start local server to receive the callback
-            print("\nStarting local server to receive callback...")
+            logger.info("Starting local server to receive callback...")
             server = HTTPServer(('localhost', 8080), CallbackHandler)
             server.auth_code = None
+            server.timeout = 5  # Lets the wait loop below check its deadline
 
             # Get the authorization URL
-            print("\nGenerating authorization URL...")
+            logger.info("Generating authorization URL...")
             authorization_url, _ = oauth.authorization_url(
                 'https://www.linkedin.com/oauth/v2/authorization',
                 state='random_state_string'
@@ -159,16 +2094,17 @@ class LinkedInAgent:
             webbrowser.open(authorization_url)
 
             # Wait for the callback
-            print("\nWaiting for callback from LinkedIn...")
-            while server.auth_code is None:
+            logger.info("Waiting for callback from LinkedIn...")
+            deadline = time.time() + LINKEDIN_AUTH_TIMEOUT
+            while server.auth_code is None and time.time() < deadline:
                 server.handle_request()
 
             if not server.auth_code:
-                print("\nAuthentication failed: No authorization code received")
-                print("Please check if you authorized the application in the browser")
+                logger.error("Authentication failed: No authorization code received")
+                logger.warning("Please check if you authorized the application in the browser")
                 return None
 
-            print("\nAuthorization code received, exchanging for access token...")
+            logger.info("Authorization code received, exchanging for access token...")
 
             # Exchange the authorization code for a token
             token_url = 'https://www.linkedin.com/oauth/v2/accessToken'
@@ -183,21 +2119,21 @@ class LinkedInAgent:
                 'Content-Type': 'application/x-www-form-urlencoded'
             }
 
-            print("\nSending token request to LinkedIn...")
-            response = requests.post(token_url, data=data, headers=headers)
+            logger.info("Sending token request to LinkedIn...")
+            response = self.http.post(token_url, data=data, headers=headers)
             
             if response.status_code != 200:
-                print(f"\nError getting access token: {response.status_code}")
-                print(f"Response: {response.text}")
-                print("\nPossible causes:")
-                print("1. Invalid client credentials")
-                print("2. Authorization code expired")
-                print("3. Incorrect redirect URI")
-                print("4. Missing or incorrect OAuth scopes")
+                logger.error(f"Error getting access token: {response.status_code}")
+                logger.error(f"Response: {response.text}")
+                logger.error("Possible causes:")
+                logger.error("1. Invalid client credentials")
+                logger.error("2. Authorization code expired")
+                logger.error("3. Incorrect redirect URI")
+                logger.error("4. Missing or incorrect OAuth scopes")
                 return None
 
-            token = response.json()
-            print("\nSuccessfully obtained access token!")
+            token = stamp_token_expiry(response.json())
+            logger.info("Successfully obtained access token!")
 
             # Get the user's profile information using the new API endpoint
             headers = {
@@ -205,184 +2141,283 @@ class LinkedInAgent:
                 'X-Restli-Protocol-Version': '2.0.0'
             }
             
-            print("\nFetching LinkedIn profile information...")
-            profile_response = requests.get('https://api.linkedin.com/v2/userinfo', headers=headers)
+            logger.info("Fetching LinkedIn profile information...")
+            profile_response = self.http.get('https://api.linkedin.com/v2/userinfo', headers=headers)
             
             if profile_response.status_code == 200:
                 profile = profile_response.json()
                 token['linkedin_id'] = profile['sub']  # Using 'sub' as the user ID
-                print(f"Successfully retrieved LinkedIn profile ID: {profile['sub']}")
+                logger.info(f"Successfully retrieved LinkedIn profile ID: {profile['sub']}")
                 
                 # Save the token for later use
-                with open('linkedin_token.json', 'w') as f:
-                    json.dump(token, f)
-                print("LinkedIn token saved successfully")
+                self.save_linkedin_token(token)
+                logger.info("LinkedIn token saved successfully")
                 return token
             else:
-                print(f"\nFailed to get LinkedIn profile: {profile_response.status_code}")
-                print(f"Response: {profile_response.text}")
-                print("\nPlease check if you have the correct permissions set in your LinkedIn app settings")
-                print("Required permissions:")
-                print("1. openid")
-                print("2. profile")
-                print("3. email")
-                print("4. w_member_social")
+                logger.error(f"Failed to get LinkedIn profile: {profile_response.status_code}")
+                logger.error(f"Response: {profile_response.text}")
+                logger.error("Please check if you have the correct permissions set in your LinkedIn app settings")
+                logger.error("Required permissions:")
+                logger.error("1. openid")
+                logger.error("2. profile")
+                logger.error("3. email")
+                logger.error("4. w_member_social")
                 return None
 
         except Exception as e:
-            print(f"\nError during LinkedIn authentication: {str(e)}")
-            print("Traceback:")
-            traceback.print_exc()
+            logger.exception(f"Error during LinkedIn authentication: {str(e)}")
             return None
         finally:
-            server.server_close()
+            if server is not None:
+                server.server_close()
 
-    def load_linkedin_token(self):
-        """Load LinkedIn token from file if it exists."""
+    def load_linkedin_token(self, path=LINKEDIN_TOKEN_FILE):
+        """Load LinkedIn token from file if it exists, refreshing it if it has expired."""
         try:
-            if os.path.exists('linkedin_token.json'):
-                with open('linkedin_token.json', 'r') as f:
-                    token = json.load(f)
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    token = stamp_token_expiry(json.load(f), issued_at=os.path.getmtime(path))
                     # Check if token is expired
                     if time.time() < token.get('expires_at', 0):
-                        print("Using existing valid LinkedIn token")
+                        logger.info("Using existing valid LinkedIn token")
                         return token
+                    elif token.get('refresh_token'):
+                        logger.warning("LinkedIn token expired, refreshing...")
+                        return self.refresh_linkedin_token(token, path)
                     else:
-                        print("LinkedIn token expired")
+                        logger.warning("LinkedIn token expired")
                         return None
             return None
         except Exception as e:
-            print(f"Error loading LinkedIn token: {str(e)}")
+            logger.error(f"Error loading LinkedIn token: {str(e)}")
             return None
 
-    def get_google_sheets_service(self):
-        """Get Google Sheets service with proper authentication"""
-        try:
-            print("Setting up Google Sheets service...")
-            SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-            creds = None
-            
-            if os.path.exists('token.pickle'):
-                print("Found existing token.pickle file")
-                with open('token.pickle', 'rb') as token:
-                    creds = pickle.load(token)
-            
-            if not creds or not creds.valid:
-                print("No valid credentials found, starting OAuth flow...")
-                if creds and creds.expired and creds.refresh_token:
-                    print("Refreshing expired credentials...")
-                    creds.refresh(Request())
-                else:
-                    if not os.path.exists('credentials.json'):
-                        raise FileNotFoundError("credentials.json not found. Please download it from Google Cloud Console")
-                    print("Starting OAuth flow...")
-                    flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-                    creds = flow.run_local_server(port=0)
-                print("Saving credentials...")
-                with open('token.pickle', 'wb') as token:
-                    pickle.dump(creds, token)
-            
-            print("Building Google Sheets service...")
-            self.service = build('sheets', 'v4', credentials=creds)
-            print("Successfully connected to Google Sheets")
-            
-        except Exception as e:
-            print(f"Error connecting to Google Sheets: {e}")
-            print("Traceback:")
-            traceback.print_exc()
-            sys.exit(1)
+    def save_linkedin_token(self, token, path=LINKEDIN_TOKEN_FILE):
+        """Write a LinkedIn token atomically so a concurrent reader never sees a partial file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(token, f)
+        os.replace(tmp_path, path)
 
-    def read_spreadsheet(self):
-        """Read the Google Sheet containing topics"""
-        try:
-            print("Reading spreadsheet...")
-            if not self.service:
-                self.get_google_sheets_service()
-            
-            print(f"Accessing spreadsheet ID: {self.spreadsheet_id}")
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range='Sheet1!A:C'
-            ).execute()
-            
-            values = result.get('values', [])
-            if not values:
-                print("No data found in the spreadsheet")
-                return []
+    def refresh_linkedin_token(self, token, path=LINKEDIN_TOKEN_FILE):
+        """Exchange a LinkedIn refresh token for a new access token, returning None on failure"""
+        if not token.get('refresh_token') or time.time() >= token.get('refresh_token_expires_at', float('inf')):
+            logger.error("LinkedIn token cannot be refreshed: no valid refresh token")
+            return None
+        response = self.http.post('https://www.linkedin.com/oauth/v2/accessToken', data={
+            'grant_type': 'refresh_token',
+            'refresh_token': token['refresh_token'],
+            'client_id': self.linkedin_client_id,
+            'client_secret': self.linkedin_client_secret
+        }, headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        if response.status_code != 200:
+            logger.error(f"Error refreshing LinkedIn token: {response.status_code}")
+            logger.error(f"Response: {response.text}")
+            return None
+        refreshed = stamp_token_expiry(response.json())
+        refreshed['linkedin_id'] = token['linkedin_id']
+        if 'refresh_token' not in refreshed:
+            refreshed['refresh_token'] = token['refresh_token']
+            if 'refresh_token_expires_at' in token:
+                refreshed['refresh_token_expires_at'] = token['refresh_token_expires_at']
+        self.save_linkedin_token(refreshed, path)
+        logger.info("LinkedIn token refreshed")
+        return refreshed
+
+    def load_linkedin_accounts(self, path):
+        """Load the accounts to fan posts out to from a JSON list of {name, token_file, owner}
+
+        owner defaults to the member behind the token; use an
+        urn:li:organization URN to post as a company page.
+        """
+        with open(path, 'r') as f:
+            entries = json.load(f)
+        accounts = []
+        for entry in entries:
+            name = entry.get('name') or entry['token_file']
+            token = self.load_linkedin_token(entry['token_file'])
+            if not token:
+                logger.warning(f"Skipping LinkedIn account {name}: no valid token in {entry['token_file']}")
+                continue
+            owner = entry.get('owner') or f"urn:li:person:{token['linkedin_id']}"
+            accounts.append(LinkedInAccount(name, token, owner, posts_per_minute=self.posts_per_minute,
+                                            post_burst=self.post_burst, token_file=entry['token_file']))
+            logger.info(f"Loaded LinkedIn account {name} posting as {owner}")
+        if not accounts:
+            raise ValueError(f"No usable LinkedIn accounts in {path}")
+        return accounts
+
+    def load_google_credentials(self):
+        """Load Google credentials from JSON, refreshing or running the OAuth flow if needed"""
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
+
+        SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+        creds = None
+
+        if os.path.exists(GOOGLE_TOKEN_FILE):
+            logger.info(f"Found existing {GOOGLE_TOKEN_FILE} file")
+            creds = Credentials.from_authorized_user_file(GOOGLE_TOKEN_FILE, SCOPES)
+        elif os.path.exists('token.pickle'):
+            # Migrate credentials saved by older versions; token.pickle is no longer written
+            logger.warning(f"Migrating token.pickle to {GOOGLE_TOKEN_FILE} (token.pickle can be deleted afterwards)")
+            with open('token.pickle', 'rb') as token:
+                creds = pickle.load(token)
+            self.save_google_credentials(creds)
+
+        if not creds or not creds.valid:
+            logger.warning("No valid credentials found, starting OAuth flow...")
+            if creds and creds.expired and creds.refresh_token:
+                logger.info("Refreshing expired credentials...")
+                creds.refresh(Request())
+            else:
+                if not os.path.exists('credentials.json'):
+                    raise FileNotFoundError("credentials.json not found. Please download it from Google Cloud Console")
+                logger.info("Starting OAuth flow...")
+                flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+                creds = flow.run_local_server(port=0)
+            logger.info("Saving credentials...")
+            self.save_google_credentials(creds)
+        return creds
+
+    def save_google_credentials(self, creds):
+        """Write Google credentials as JSON, atomically"""
+        tmp_path = f"{GOOGLE_TOKEN_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(creds.to_json())
+        os.replace(tmp_path, GOOGLE_TOKEN_FILE)
+
+    def get_google_sheets_service(self):
+        """Get Google Sheets service with proper authentication"""
+        try:
+            from googleapiclient.discovery import build
+
+            logger.info("Setting up Google Sheets service...")
+            self.google_creds = self.load_google_credentials()
             
-            print(f"Found {len(values)} rows in spreadsheet")
-            # Convert to list of dictionaries
-            headers = values[0]
-            print("Headers:", headers)  # Debugging line to check headers
-            data = []
-            for row in values[1:]:
-                data.append(dict(zip(headers, row)))
-            print(f"Successfully read {len(data)} rows from spreadsheet")
-            print("Data structure:", data)  # Debugging line to check data structure
-            return data
+            logger.info("Building Google Sheets service...")
+            self.service = build('sheets', 'v4', credentials=self.google_creds)
+            logger.info("Successfully connected to Google Sheets")
             
         except Exception as e:
-            print(f"Error reading spreadsheet: {e}")
-            print("Traceback:")
-            traceback.print_exc()
+            logger.exception(f"Error connecting to Google Sheets: {e}")
             sys.exit(1)
 
+    def read_spreadsheet(self, start=1, page_rows=SHEET_PAGE_ROWS):
+        """Yield the sheet from row index start on, as lists of SheetRow records
+
+        Rows are fetched page_rows at a time with one values.batchGet, so
+        memory stays flat however large the sheet is. Only the topic, status
+        and publish time columns are downloaded, not the generated posts.
+        Values are read unformatted, so publish times that Sheets recognised
+        as dates come back as serial numbers rather than in the sheet's
+        display format. Reading stops at the first page without any values.
+        """
+        if not self.service:
+            self.get_google_sheets_service()
+        values = self.service.spreadsheets().values()
+        while True:
+            first, last = start + 1, start + page_rows  # +1 because spreadsheet is 1-indexed
+            ranges = [f'Sheet1!{column}{first}:{column}{last}'
+                      for column in ('A', SHEET_STATUS_COLUMN, SHEET_PUBLISH_AT_COLUMN)]
+            with self.metrics.stage('sheet_read'):
+                result = values.batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges,
+                                         valueRenderOption='UNFORMATTED_VALUE').execute()
+            columns = [value_range.get('values', []) for value_range in result.get('valueRanges', [])]
+            count = max((len(column) for column in columns), default=0)
+            if not count:
+                return
+            page = []
+            for offset in range(count):
+                # Each range yields one list of cells per row, shorter when trailing cells are empty
+                cells = [column[offset] if offset < len(column) else [] for column in columns]
+                topic, status, publish_at = [column[0] if column else '' for column in cells]
+                if isinstance(publish_at, str):
+                    publish_at = publish_at.strip()
+                page.append(SheetRow(start + offset, str(topic).strip(), str(status), publish_at))
+            yield page
+            start += page_rows
+
+    def search_images(self, topic):
+        """Return up to IMAGE_SEARCH_PER_PAGE image URLs for topic from one Unsplash search request"""
+        unsplash_access_key = os.getenv('UNSPLASH_ACCESS_KEY')
+        if not unsplash_access_key:
+            logger.warning("UNSPLASH_ACCESS_KEY not found in .env file")
+            return []
+        logger.info("Searching Unsplash for images...")
+        params = {'query': topic, 'per_page': IMAGE_SEARCH_PER_PAGE, 'client_id': unsplash_access_key}
+        with self.metrics.stage('find_image') as stage:
+            response = self.http.get('https://api.unsplash.com/search/photos', params=params)
+            if response.status_code != 200:
+                stage.fail()
+        with self._unsplash_lock:
+            self.unsplash_stats['calls'] += 1
+        if response.status_code != 200:
+            logger.error(f"Failed to search images. Status code: {response.status_code}")
+            return []
+        return [result['urls']['regular'] for result in response.json().get('results', [])]
+
+    def related_image_query(self, topic):
+        """Query of a near-duplicate topic searched earlier in this run, or None"""
+        with self._unsplash_lock:
+            if self.image_topics is None:
+                self.image_topics = TopicIndex(self.dedupe_threshold)
+            key = len(self.image_queries)
+            match = self.image_topics.add(key, topic)
+            if match is None:
+                self.image_queries[key] = TopicIndex.normalize(topic)
+                return None
+            return self.image_queries[match[0]]
+
     def find_image(self, topic):
-        """Find and download an image related to the topic from Unsplash"""
+        """Pick an image for the topic from Unsplash search results
+
+        Candidates are cached per topic (see ImageCache), so only a topic
+        without fresh candidates costs an API call. A topic that is a near
+        duplicate of one searched earlier in the run shares its candidates.
+        """
         try:
-            print(f"Finding image for topic: {topic}")
-            unsplash_access_key = os.getenv('UNSPLASH_ACCESS_KEY')
-            if not unsplash_access_key:
-                print("UNSPLASH_ACCESS_KEY not found in .env file")
-                return None
-                
-            url = f"https://api.unsplash.com/photos/random?query={topic}&client_id={unsplash_access_key}"
-            print(f"Requesting image from Unsplash...")
-            response = requests.get(url)
-            if response.status_code == 200:
-                image_url = response.json()['urls']['regular']
-                print(f"Successfully found image URL: {image_url}")
-                return image_url
-            print(f"Failed to find image. Status code: {response.status_code}")
-            return None
-            
+            logger.info(f"Finding image for topic: {topic}")
+            query = TopicIndex.normalize(topic)
+            related = self.related_image_query(topic)
+            source = 'cached'
+            image_url = self.image_cache.take(query)
+            if image_url is None:
+                candidates = self.image_cache.candidates(related) if related and related != query else []
+                if candidates:
+                    source = 'shared'
+                else:
+                    source = None
+                    candidates = self.search_images(topic)
+                if not candidates:
+                    logger.error(f"No Unsplash images found for topic: {topic}")
+                    return None
+                self.image_cache.add(query, candidates)
+                image_url = self.image_cache.take(query)
+            with self._unsplash_lock:
+                self.unsplash_stats['images'] += 1
+                if source:
+                    self.unsplash_stats[source] += 1
+            logger.info(f"Successfully found image URL: {image_url}" + (f" ({source})" if source else ''))
+            return image_url
+
         except Exception as e:
-            print(f"Error finding image: {e}")
-            print("Traceback:")
-            traceback.print_exc()
+            logger.exception(f"Error finding image: {e}")
             return None
 
-    def generate_content(self, topic: str) -> str:
-        """Generate content for a given topic using Gemini."""
-        try:
-            # Define emoji mappings for different topics
-            emoji_mapping = {
-                'technology': '🚀',
-                'marketing': '📊',
-                'ai': '🤖',
-                'machine learning': '🧠',
-                'cyber security': '🔒',
-                'network': '🌐',
-                'data': '📈',
-                'business': '💼',
-                'development': '💻',
-                'cloud': '☁️',
-                'blockchain': '⛓️',
-                'iot': '📱',
-                'automation': '⚙️',
-                'analytics': '📊',
-                'innovation': '💡'
-            }
-
-            # Determine the most relevant emoji for the topic
-            topic_lower = topic.lower()
-            emoji = '💡'  # Default emoji
-            for key, value in emoji_mapping.items():
-                if key in topic_lower:
-                    emoji = value
-                    break
+    def topic_emoji(self, topic):
+        """Pick the emoji that opens a post about topic"""
+        # Every keyword in the topic, then the one listed first wins
+        found = {match.group(1) for match in TOPIC_EMOJI_PATTERN.finditer(topic.lower())}
+        if not found:
+            return DEFAULT_TOPIC_EMOJI
+        return TOPIC_EMOJIS[min(TOPIC_EMOJI_PRIORITY[key] for key in found)][1]
 
-            prompt = f"""Generate a professional LinkedIn post about {topic}. 
+    def content_prompt(self, topic):
+        """Single-topic Gemini prompt; also the content cache key for the topic"""
+        emoji = self.topic_emoji(topic)
+        return f"""Generate a professional LinkedIn post about {topic}. 
             The post should:
             1. Start with an engaging hook using {emoji}
             2. Include 2-3 key points about the topic
@@ -410,279 +2445,1436 @@ class LinkedInAgent:
             
             #RelevantHashtags #MoreHashtags"""
 
-            response = self.model.generate_content(prompt)
-            content = response.text
-            
-            # Ensure content is within LinkedIn's limit
-            if len(content) > 2500:
-                content = content[:2500] + "...\n\n#LinkedInPost"
-            
+    def batch_prompt(self, topics):
+        """One Gemini prompt asking for a post per topic, returned as a JSON object keyed by topic"""
+        listing = '\n'.join(f"- {json.dumps(topic, ensure_ascii=False)} (hook emoji: {self.topic_emoji(topic)})"
+                            for topic in topics)
+        return f"""Generate one professional LinkedIn post for each of these topics:
+{listing}
+
+Each post should:
+1. Start with an engaging hook using the topic's hook emoji
+2. Include 2-3 key points about the topic
+3. Use relevant emojis for each section
+4. End with a call to action
+5. Include relevant hashtags
+6. Keep the tone professional but engaging
+7. Format the topic name in bold
+8. Ensure the content is accurate and informative
+9. Use proper spacing and formatting
+10. Keep the post under 2500 characters to account for emojis and formatting
+
+Example format of one post:
+💡 **Topic Name**
+
+[Brief engaging introduction - 1-2 sentences]
+
+🔑 Key Point 1
+[Concise explanation - 2-3 sentences]
+
+💡 Key Point 2
+[Concise explanation - 2-3 sentences]
+
+[Call to action - 1 sentence]
+
+#RelevantHashtags #MoreHashtags
+
+Respond with only a JSON object that maps each topic, exactly as written above, to its post as a string."""
+
+    @staticmethod
+    def trim_content(content, truncated=False):
+        """Cut content down to LinkedIn's limit at a clean sentence or hashtag boundary
+
+        truncated marks a reply the model broke off (at its token limit),
+        which is cut back the same way even when it is under the limit.
+        """
+        if len(content) <= POST_MAX_CHARS and not truncated:
             return content
+        window = content[:POST_MAX_CHARS]
+        partial = re.search(r'\s\S*$', window)
+        if partial and (truncated or not content[POST_MAX_CHARS].isspace()):
+            # Drop the word (or hashtag) the limit falls in
+            window = window[:partial.start()]
+        window = window.rstrip()
+        if window.rsplit('\n', 1)[-1].lstrip().startswith('#'):
+            # Cut inside the closing hashtags, which are complete up to here
+            return window
+
+        tag = f"\n\n{POST_TRUNCATION_TAG}"
+        window = window[:POST_MAX_CHARS - len(tag)]
+        ends = [match.end() for match in SENTENCE_END.finditer(window)]
+        if ends:
+            window = window[:ends[-1]]
+        return window.rstrip() + tag
+
+    @staticmethod
+    def is_quota_error(error):
+        """Whether a Gemini error is a rate or quota rejection (HTTP 429, ResourceExhausted)"""
+        return getattr(error, 'code', None) == 429
+
+    @staticmethod
+    def token_counts(usage, prompt, text):
+        """(prompt tokens, output tokens, estimated) from a response's usage metadata.
+
+        Older SDKs report no usage, so the counts are then estimated from the text length.
+        """
+        prompt_tokens = getattr(usage, 'prompt_token_count', None)
+        output_tokens = getattr(usage, 'candidates_token_count', None)
+        if prompt_tokens and output_tokens is not None:
+            return prompt_tokens, output_tokens, False
+        return (len(prompt) // GENERATE_CHARS_PER_TOKEN + 1,
+                len(text) // GENERATE_CHARS_PER_TOKEN + 1, True)
+
+    def call_gemini(self, send, prompt, max_output_tokens, topics):
+        """Make one Gemini request within the budgets, retrying quota errors with backoff.
+
+        send() makes the request and returns (result, usage metadata, output text).
+        Returns (result, {'prompt_tokens', 'output_tokens', 'estimated', 'cost'}).
+        """
+        estimate = len(prompt) // GENERATE_CHARS_PER_TOKEN + 1 + max_output_tokens
+        attempt = 0
+        while True:
+            event, waited = self.gemini_budget.acquire(estimate)
+            if waited:
+                self.metrics.observe('gemini_throttle', waited)
+                logger.info(f"Waited {waited:.2f}s for the Gemini request budget")
+            try:
+                result, metadata, text = send()
+            except Exception as e:
+                if not self.is_quota_error(e) or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                delay = GEMINI_RETRY_DELAY * 2 ** attempt
+                attempt += 1
+                logger.warning(f"Gemini quota exceeded, retrying in {delay}s "
+                               f"(attempt {attempt} of {GEMINI_MAX_RETRIES}): {e}")
+                self.gemini_budget.backoff(delay)
+                continue
+            prompt_tokens, output_tokens, estimated = self.token_counts(metadata, prompt, text)
+            self.gemini_budget.record(event, prompt_tokens + output_tokens)
+            cost = self.gemini_usage.record(topics, prompt_tokens, output_tokens, estimated)
+            return result, {'prompt_tokens': prompt_tokens, 'output_tokens': output_tokens,
+                            'estimated': estimated, 'cost': cost}
+
+    @staticmethod
+    def finish_reason(chunk):
+        """Name of the response chunk's finish reason (e.g. 'STOP', 'MAX_TOKENS'), or None before the last chunk"""
+        candidates = getattr(chunk, 'candidates', None)
+        if not candidates:
+            return None
+        reason = getattr(candidates[0], 'finish_reason', None)
+        return getattr(reason, 'name', reason)
+
+    @staticmethod
+    def describe_usage(usage):
+        return (f"{usage['prompt_tokens']} prompt + {usage['output_tokens']} output tokens"
+                f"{' (estimated)' if usage['estimated'] else ''}, ${usage['cost']:.4f}")
+
+    def stream_content(self, prompt, topic):
+        """Stream a Gemini response, stopping as soon as the post has reached the length budget.
+
+        Returns (text, seconds to the first chunk, total seconds, stop reason, usage). The stop reason
+        is 'length' when the post reached the length budget, 'tokens' when the model hit
+        max_output_tokens and None when the post came back complete.
+        """
+        def send():
+            start = time.perf_counter()
+            first_chunk = None
+            parts = []
+            length = 0
+            stopped = None
+            metadata = None
+            response = self.model.generate_content(
+                prompt, generation_config={'max_output_tokens': POST_MAX_TOKENS}, stream=True
+            )
+            for chunk in response:
+                # Token counts arrive with the chunks, complete on the last one
+                metadata = getattr(chunk, 'usage_metadata', None) or metadata
+                if self.finish_reason(chunk) == 'MAX_TOKENS':
+                    stopped = 'tokens'
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # A chunk without text parts, e.g. the final one carrying only the finish reason
+                    continue
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+                parts.append(text)
+                length += len(text)
+                if length > POST_MAX_CHARS:
+                    # Anything past the budget would be trimmed anyway
+                    stopped = 'length'
+                    break
+            total = time.perf_counter() - start
+            text = ''.join(parts)
+            return (text, first_chunk if first_chunk is not None else total, total, stopped), metadata, text
+
+        result, usage = self.call_gemini(send, prompt, POST_MAX_TOKENS, [topic])
+        return result + (usage,)
+
+    def max_generate_batch(self):
+        """Topics per batched request, capped so K posts fit in the model's output limit"""
+        limit = (self.model_info or {}).get('output_token_limit')
+        if limit:
+            return max(1, min(self.generate_batch_size, limit // POST_MAX_TOKENS))
+        return self.generate_batch_size
+
+    @staticmethod
+    def parse_batch_response(text, topics):
+        """Split a batched JSON response into {topic: post}, leaving out entries that fail validation"""
+        text = text.strip()
+        if text.startswith('```'):
+            # Drop a ```json ... ``` fence around the object
+            text = text.split('\n', 1)[1] if '\n' in text else ''
+            text = text.rsplit('```', 1)[0]
+        try:
+            data = json.loads(text)
+        except ValueError:
+            start, end = text.find('{'), text.rfind('}')
+            try:
+                data = json.loads(text[start:end + 1]) if 0 <= start < end else None
+            except ValueError:
+                data = None
+        if not isinstance(data, dict):
+            return {}
+
+        # Match keys loosely in case the model changed case or spacing
+        by_key = {' '.join(str(key).split()).casefold(): value for key, value in data.items()}
+        posts = {}
+        for topic in topics:
+            post = data.get(topic, by_key.get(' '.join(topic.split()).casefold()))
+            if isinstance(post, str) and len(post.strip()) >= GENERATE_BATCH_MIN_CHARS:
+                posts[topic] = post.strip()
+        return posts
+
+    def generate_batch(self, topics):
+        """Generate content for several topics with one Gemini request per batch.
+
+        Returns {topic: content} for the topics that came back valid (or were
+        cached); the caller falls back to generate_content for the rest.
+        """
+        results = {}
+        misses = []
+        for topic in dict.fromkeys(topics):
+            content = None
+            if self.content_cache is not None:
+                content = self.content_cache.get(ContentCache.make_key(self.model_name, self.content_prompt(topic)))
+            if content is not None:
+                results[topic] = self.trim_content(content)
+            else:
+                misses.append(topic)
+
+        self.model  # Loads the model metadata that caps the batch size
+        size = self.max_generate_batch()
+        for i in range(0, len(misses), size):
+            batch = misses[i:i + size]
+            logger.info(f"Generating content for {len(batch)} topics in one request...")
+            prompt = self.batch_prompt(batch)
+            # Brackets, quotes and keys add a little on top of the posts themselves
+            max_output_tokens = len(batch) * POST_MAX_TOKENS + 100
+
+            def send():
+                response = self.model.generate_content(
+                    prompt, generation_config={'max_output_tokens': max_output_tokens},
+                )
+                return response.text, getattr(response, 'usage_metadata', None), response.text
+
+            try:
+                with self.metrics.stage('generate_batch'):
+                    text, usage = self.call_gemini(send, prompt, max_output_tokens, batch)
+                logger.info(f"Batched request for {len(batch)} topics used {self.describe_usage(usage)}")
+                posts = self.parse_batch_response(text, batch)
+            except Exception as e:
+                logger.error(f"Error generating batched content: {str(e)}")
+                posts = {}
+            with self._generate_stats_lock:
+                self.generate_stats['batch_requests'] += 1
+                self.generate_stats['batched_topics'] += len(posts)
+                self.generate_stats['fallbacks'] += len(batch) - len(posts)
+            if len(posts) < len(batch):
+                logger.warning(f"{len(batch) - len(posts)} of {len(batch)} batched posts failed validation, "
+                               f"generating them one by one")
+            for topic, content in posts.items():
+                if self.content_cache is not None:
+                    self.content_cache.put(ContentCache.make_key(self.model_name, self.content_prompt(topic)), content)
+                results[topic] = self.trim_content(content)
+        return results
+
+    def prefetch_content(self, topics):
+        """Generate content for upcoming topics in batches, to be picked up by generate_content"""
+        if self.generate_batch_size <= 1 or len(topics) < 2:
+            return
+        try:
+            generated = self.generate_batch(topics)
+        except Exception as e:
+            logger.error(f"Error prefetching content: {str(e)}")
+            return
+        with self._generate_stats_lock:
+            self.pregenerated.update(generated)
+
+    def generate_content(self, topic: str) -> str:
+        """Generate content for a given topic using Gemini."""
+        try:
+            with self._generate_stats_lock:
+                content = self.pregenerated.pop(topic, None)
+            if content is not None:
+                return content
+
+            prompt = self.content_prompt(topic)
+            cache_key = None
+            content = None
+            if self.content_cache is not None:
+                cache_key = ContentCache.make_key(self.model_name, prompt)
+                content = self.content_cache.get(cache_key)
+                if content is not None:
+                    logger.info(f"Using cached content for topic: {topic}")
+            if content is None:
+                with self.metrics.stage('generate_content'):
+                    content, first_chunk, total, stopped, usage = self.stream_content(prompt, topic)
+                self.metrics.observe('generate_first_token', first_chunk)
+                note = {'length': ', stopped at the length budget', 'tokens': ', cut off at the token limit'}.get(stopped, '')
+                logger.info(f"Generated {len(content)} characters for topic {topic} in {total:.2f}s "
+                            f"(first token after {first_chunk:.2f}s{note}; {self.describe_usage(usage)})")
+                if not content.strip():
+                    raise ValueError("Gemini returned no text")
+                if stopped == 'tokens':
+                    # Cached trimmed, as a cache hit cannot tell the post was cut off
+                    content = self.trim_content(content, truncated=True)
+                if cache_key is not None:
+                    self.content_cache.put(cache_key, content)
+            
+            return self.trim_content(content)
         except Exception as e:
-            print(f"Error generating content: {str(e)}")
-            return f"Error generating content for {topic}"
+            logger.error(f"Error generating content: {str(e)}")
+            return None
+
+    def update_spreadsheet_row(self, row_index, content, image_url, status=SHEET_STATUS_DONE):
+        """Queue an update of a specific row with new content and image URL
 
-    def update_spreadsheet_row(self, row_index, content, image_url):
-        """Update a specific row in the spreadsheet with new content and image URL"""
+        Updates are buffered and written in batches by self.sheet_writer;
+        call self.sheet_writer.flush() to force pending rows out.
+        """
         try:
-            print(f"Updating spreadsheet row {row_index}...")
+            logger.info(f"Queueing spreadsheet update for row {row_index + 1}...")
             if not self.service:
                 self.get_google_sheets_service()
-            
-            range_name = f'Sheet1!B{row_index+1}:C{row_index+1}'  # +1 because spreadsheet is 1-indexed
-            values = [[content, image_url]]
-            
-            body = {
-                'values': values
-            }
-            
-            result = self.service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                body=body
-            ).execute()
-            
-            print(f"Successfully updated spreadsheet row {row_index}")
-            return True
-            
+            return self.sheet_writer.add(row_index, content, image_url, status)
+
         except Exception as e:
-            print(f"Error updating spreadsheet: {e}")
-            print("Traceback:")
-            traceback.print_exc()
+            logger.exception(f"Error updating spreadsheet: {e}")
             return False
 
-    def post_to_linkedin(self, topic, content, image_url):
-        """Post content to LinkedIn."""
-        if not self.linkedin_token:
-            print("Cannot post to LinkedIn: No valid token")
-            return False
+    def download_image(self, image_url):
+        """Download an image and return its bytes, or None on failure"""
+        logger.info(f"Downloading image from URL: {image_url}")
+        with self.metrics.stage('image_download') as stage:
+            image_response = self.http.get(image_url)
+            if image_response.status_code != 200:
+                stage.fail()
+                logger.error(f"Failed to download image: {image_response.status_code}")
+                return None
+            return image_response.content
 
+    def prepare_image(self, image_bytes):
+        """Resize and recompress an image in the process pool, falling back to the original bytes"""
+        if not self.process_images:
+            return image_bytes
         try:
-            print("Preparing LinkedIn post...")
-            
-            # Clean the content by removing '*' and extra whitespace
-            cleaned_content = content.replace('*', '').strip()
-            
-            # Download the image
-            print(f"Downloading image from URL: {image_url}")
-            image_response = requests.get(image_url)
-            if image_response.status_code != 200:
-                print(f"Failed to download image: {image_response.status_code}")
-                return False
+            if self.image_pool is None:
+                # Started from worker threads: forking a multi-threaded process can deadlock the child
+                self.image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS,
+                                                      mp_context=multiprocessing.get_context('spawn'))
+            with self.metrics.stage('image_process'):
+                future = self.image_pool.submit(process_image, image_bytes, IMAGE_MAX_SIZE,
+                                                self.image_format, self.image_quality)
+                encoded, size_in, size_out, seconds, changed = future.result()
+        except Exception as e:
+            logger.error(f"Error processing image, uploading original: {e}")
+            return image_bytes
 
-            # Save the image temporarily
-            with open('temp_image.jpg', 'wb') as f:
-                f.write(image_response.content)
-
-            # Register the image upload
-            print("Registering image upload...")
-            register_upload_url = 'https://api.linkedin.com/v2/assets?action=registerUpload'
-            register_upload_data = {
-                "registerUploadRequest": {
-                    "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
-                    "owner": f"urn:li:person:{self.linkedin_token['linkedin_id']}",
-                    "serviceRelationships": [
-                        {
-                            "relationshipType": "OWNER",
-                            "identifier": "urn:li:userGeneratedContent"
-                        }
-                    ]
-                }
-            }
+        if size_out >= size_in and not changed:
+            # Already smaller than anything we would produce, and neither too large nor carrying metadata
+            logger.info(f"Image kept as-is ({size_in} bytes, re-encoding saved nothing)")
+            encoded, size_out = image_bytes, size_in
+        else:
+            saved = f"{size_in - size_out} saved" if size_out < size_in else "resized or stripped of metadata"
+            logger.info(f"Image re-encoded: {size_in} -> {size_out} bytes ({saved}) in {seconds * 1000:.0f} ms")
+        with self._image_stats_lock:
+            self.image_stats['images'] += 1
+            self.image_stats['bytes_in'] += size_in
+            self.image_stats['bytes_out'] += size_out
+            self.image_stats['encode_seconds'] += seconds
+        return encoded
 
-            headers = {
-                'Authorization': f'Bearer {self.linkedin_token["access_token"]}',
-                'Content-Type': 'application/json',
-                'X-Restli-Protocol-Version': '2.0.0'
+    def default_account(self):
+        """The account behind linkedin_token.json, sharing the agent's HTTP session and rate limiter"""
+        return LinkedInAccount(
+            'default', self.linkedin_token, f"urn:li:person:{self.linkedin_token['linkedin_id']}",
+            http=self.http, limiter=self.post_limiter
+        )
+
+    def upload_image_asset(self, account, image_bytes):
+        """Register an image upload for the account's owner and upload it, returning the asset URN"""
+        # Register the image upload
+        logger.info(f"[{account.name}] Registering image upload...")
+        register_upload_url = 'https://api.linkedin.com/v2/assets?action=registerUpload'
+        register_upload_data = {
+            "registerUploadRequest": {
+                "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
+                "owner": account.owner,
+                "serviceRelationships": [
+                    {
+                        "relationshipType": "OWNER",
+                        "identifier": "urn:li:userGeneratedContent"
+                    }
+                ]
             }
+        }
 
-            register_response = requests.post(register_upload_url, headers=headers, json=register_upload_data)
+        with self.metrics.stage('register_upload') as stage:
+            register_response = account.http.post(register_upload_url, headers=account.headers(), json=register_upload_data)
             if register_response.status_code != 200:
-                print(f"Failed to register upload: {register_response.status_code}")
-                print(f"Response: {register_response.text}")
-                return False
+                stage.fail()
+        if register_response.status_code != 200:
+            logger.error(f"[{account.name}] Failed to register upload: {register_response.status_code}")
+            logger.error(f"Response: {register_response.text}")
+            return None
 
-            upload_url = register_response.json()['value']['uploadMechanism']['com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest']['uploadUrl']
-            asset = register_response.json()['value']['asset']
+        registration = register_response.json()['value']
+        upload_url = registration['uploadMechanism']['com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest']['uploadUrl']
+        asset = registration['asset']
 
-            # Upload the image
-            print("Uploading image...")
-            with open('temp_image.jpg', 'rb') as f:
-                upload_response = requests.put(upload_url, data=f.read())
-                if upload_response.status_code != 201:
-                    print(f"Failed to upload image: {upload_response.status_code}")
-                    return False
+        # Upload the image straight from memory
+        logger.info(f"[{account.name}] Uploading image...")
+        with self.metrics.stage('upload_put') as stage:
+            upload_response = account.http.put(upload_url, data=image_bytes)
+            if upload_response.status_code != 201:
+                stage.fail()
+        if upload_response.status_code != 201:
+            logger.error(f"[{account.name}] Failed to upload image: {upload_response.status_code}")
+            return None
+        return asset
 
-            # Create the post with image
-            print("Creating LinkedIn post with image...")
-            post_data = {
-                "author": f"urn:li:person:{self.linkedin_token['linkedin_id']}",
-                "lifecycleState": "PUBLISHED",
-                "specificContent": {
-                    "com.linkedin.ugc.ShareContent": {
-                        "shareCommentary": {
-                            "text": f"{topic}\n\n{cleaned_content}"
-                        },
-                        "shareMediaCategory": "IMAGE",
-                        "media": [
-                            {
-                                "status": "READY",
-                                "description": {
-                                    "text": topic
-                                },
-                                "media": asset,
-                                "title": {
-                                    "text": topic
-                                }
+    def create_post(self, account, topic, cleaned_content, asset):
+        """Publish a post with an uploaded image as the account's owner, returning the post id"""
+        # Create the post with image
+        logger.info(f"[{account.name}] Creating LinkedIn post with image...")
+        post_data = {
+            "author": account.owner,
+            "lifecycleState": "PUBLISHED",
+            "specificContent": {
+                "com.linkedin.ugc.ShareContent": {
+                    "shareCommentary": {
+                        "text": f"{topic}\n\n{cleaned_content}"
+                    },
+                    "shareMediaCategory": "IMAGE",
+                    "media": [
+                        {
+                            "status": "READY",
+                            "description": {
+                                "text": topic
+                            },
+                            "media": asset,
+                            "title": {
+                                "text": topic
                             }
-                        ]
-                    }
-                },
-                "visibility": {
-                    "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+                        }
+                    ]
                 }
+            },
+            "visibility": {
+                "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
             }
+        }
 
-            response = requests.post(
+        # Wait for the account's rate limiter before publishing
+        waited = account.limiter.acquire()
+        if waited:
+            logger.info(f"[{account.name}] Rate limiter delayed post by {waited:.1f}s")
+        with self.metrics.stage('ugc_posts') as stage:
+            response = account.http.post(
                 'https://api.linkedin.com/v2/ugcPosts',
-                headers=headers,
+                headers=account.headers(),
                 json=post_data
             )
-
             if response.status_code != 201:
-                print(f"Failed to create post: {response.status_code}")
-                print(f"Response: {response.text}")
-                return False
+                stage.fail()
 
-            print("Successfully posted to LinkedIn!")
-            print("Post URL:", response.headers.get('x-restli-id'))
-            
-            # Clean up temporary file
-            try:
-                os.remove('temp_image.jpg')
-            except:
-                pass
-                
-            return True
+        if response.status_code != 201:
+            logger.error(f"[{account.name}] Failed to create post: {response.status_code}")
+            logger.error(f"Response: {response.text}")
+            return None
+
+        post_id = response.headers.get('x-restli-id')
+        logger.info(f"[{account.name}] Successfully posted to LinkedIn!")
+        logger.info(f"Post URL: {post_id}")
+        return post_id
+
+    def image_content_key(self, image_bytes):
+        """Hash of the downloaded image plus the settings it will be re-encoded with"""
+        settings = f"{self.image_format}:{self.image_quality}" if self.process_images else 'original'
+        return hashlib.sha256(image_bytes + settings.encode('utf-8')).hexdigest()
 
+    def find_post(self, account, job, text):
+        """Look for a post whose ugcPosts call was interrupted among the owner's recent posts
+
+        Returns its id, or None if no recent post has the same text. Raises
+        if the posts cannot be read, so an uncertain post is never sent twice.
+        """
+        logger.info(f"[{account.name}] Checking whether row {job.row_index + 1} was posted before the last run stopped...")
+        authors = urllib.parse.quote(f"List({account.owner})", safe='()')
+        with self.metrics.stage('post_lookup') as stage:
+            response = account.http.get(
+                f'https://api.linkedin.com/v2/ugcPosts?q=authors&authors={authors}&sortBy=CREATED&count={POST_LOOKUP_COUNT}',
+                headers=account.headers()
+            )
+            if response.status_code != 200:
+                stage.fail()
+        if response.status_code != 200:
+            row = job.row_index + 1
+            reason = ' (reading posts needs the r_member_social permission)' if response.status_code == 403 else ''
+            raise RuntimeError(f"Cannot read recent posts: {response.status_code}{reason}. Row {row} may already be "
+                               f"published, so it is not posted again; check LinkedIn and rerun with "
+                               f"--mark-posted {row} if the post exists or --repost {row} if it does not")
+        for element in response.json().get('elements', []):
+            share = element.get('specificContent', {}).get('com.linkedin.ugc.ShareContent', {})
+            if share.get('shareCommentary', {}).get('text') == text:
+                return element.get('id')
+        return None
+
+    def publish(self, account, topic, cleaned_content, image_bytes, asset=None, image_ref=None, job=None,
+                upload_only=False):
+        """Upload the image (unless an asset is given) and create the post for one account
+
+        image_ref is the (content hash, source URL) pair recorded in the asset
+        index after a fresh upload. With a job, the uploaded asset and the
+        post id are recorded as soon as they exist, and a post an earlier run
+        may have sent is looked up instead of being created again. With
+        upload_only the job's asset is recorded without creating the post.
+        Returns (success, seconds).
+        """
+        start = time.perf_counter()
+        if time.time() >= account.token.get('expires_at', float('inf')):
+            # Never fall back to an interactive login while posting
+            logger.error(f"[{account.name}] Cannot post to LinkedIn: token expired")
+            return False, 0.0
+        try:
+            post_id = None
+            if job is not None and job.account(account.name).get('state') == 'posting' and not upload_only:
+                post_id = self.find_post(account, job, f"{topic}\n\n{cleaned_content}")
+                if post_id is not None:
+                    logger.info(f"[{account.name}] Row {job.row_index + 1} was already posted as {post_id}")
+                    job.update_account(account.name, post_id=post_id, state='posted')
+            if post_id is None:
+                reused = asset is not None
+                if reused:
+                    logger.info(f"[{account.name}] Reusing uploaded image {asset}")
+                else:
+                    asset = self.upload_image_asset(account, image_bytes)
+                    if asset is not None and image_ref is not None and self.asset_index is not None:
+                        self.asset_index.add(account.owner, image_ref[0], image_ref[1], asset)
+                if asset is not None and upload_only:
+                    if job is not None and job.account(account.name).get('asset') != asset:
+                        job.update_account(account.name, asset=asset, state='uploaded')
+                    return True, time.perf_counter() - start
+                claimed = False
+                if asset is not None:
+                    # Mark the post as in flight: if the run dies now, the next one looks it up first.
+                    # Another run holding the same row may have posted it meanwhile.
+                    claimed = job is None or job.claim_post(account.name, asset)
+                    if claimed:
+                        post_id = self.create_post(account, topic, cleaned_content, asset)
+                        if job is not None:
+                            job.update_account(account.name, post_id=post_id, state='posted' if post_id else 'uploaded')
+                    else:
+                        post_id = job.account(account.name).get('post_id')
+                        if post_id is not None:
+                            logger.info(f"[{account.name}] Row {job.row_index + 1} was already posted as {post_id} "
+                                        f"by another run")
+                        else:
+                            logger.error(f"[{account.name}] Row {job.row_index + 1} is being posted by another run, "
+                                         f"not posting it again")
+                if claimed and reused and post_id is None:
+                    if self.asset_index is not None:
+                        self.asset_index.discard(account.owner, asset)
+                    if job is not None:
+                        job.update_account(account.name, asset=None, state=None)
+            success = post_id is not None
         except Exception as e:
-            print(f"Error posting to LinkedIn: {str(e)}")
-            print("Traceback:")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception(f"[{account.name}] Error posting to LinkedIn: {str(e)}")
+            success = False
+        elapsed = time.perf_counter() - start
+        with self._account_stats_lock:
+            stats = self.account_stats.setdefault(account.name, {'posts': 0, 'failures': 0, 'seconds': 0.0})
+            stats['posts' if success else 'failures'] += 1
+            stats['seconds'] += elapsed
+        return success, elapsed
+
+    def post_to_linkedin(self, topic, content, image_url, job=None, upload_only=False):
+        """Post content to LinkedIn, once per configured account.
+
+        With a job, accounts it was already posted to are skipped and images
+        an earlier run uploaded for it are reused. upload_only stops once each
+        account has the image uploaded, leaving only the post to be created.
+        """
+        accounts = self.accounts or ([self.default_account()] if self.linkedin_token else [])
+        if not accounts:
+            logger.error("Cannot post to LinkedIn: No valid token")
             return False
 
-    def process_spreadsheet_and_post(self):
-        """Process spreadsheet data and post to LinkedIn"""
         try:
-            # Read spreadsheet data
-            sheet = self.service.spreadsheets()
-            result = sheet.values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range='Sheet1!A:C'
-            ).execute()
-            
-            values = result.get('values', [])
-            if not values:
-                print("No data found in spreadsheet")
-                return
-            
-            print("\nCurrent spreadsheet data:")
-            for i, row in enumerate(values):
-                print(f"Row {i+1}: {row}")
+            logger.info("Preparing LinkedIn post...")
             
-            # Find the most recent row without content
-            last_row_without_content = None
-            for i in range(len(values)-1, 0, -1):  # Start from the last row and go up
-                row = values[i]
-                if len(row) < 2 or not row[1]:  # Check if content is missing
-                    last_row_without_content = row
+            # Clean the content by removing '*' and extra whitespace
+            cleaned_content = content.replace('*', '').strip()
+
+            assets = {}
+            if job is not None:
+                accounts = [account for account in accounts if not job.account(account.name).get('post_id')]
+                if not accounts:
+                    return True
+                for account in accounts:
+                    assets[account.name] = job.account(account.name).get('asset')
+
+            # Images this owner already uploaded from the same URL need no download at all
+            if self.asset_index is not None:
+                for account in accounts:
+                    if not assets.get(account.name):
+                        assets[account.name] = self.asset_index.find_by_url(account.owner, image_url)
+
+            image_bytes = None
+            image_ref = None
+            if not all(assets.get(account.name) for account in accounts):
+                # Download the image into a single in-memory buffer, shared by every account
+                image_bytes = self.download_image(image_url)
+                if image_bytes is None:
+                    return False
+                image_ref = (self.image_content_key(image_bytes), image_url)
+                if self.asset_index is not None:
+                    for account in accounts:
+                        if not assets.get(account.name):
+                            assets[account.name] = self.asset_index.find_by_hash(account.owner, image_ref[0])
+                if not all(assets.get(account.name) for account in accounts):
+                    image_bytes = self.prepare_image(image_bytes)
+
+            if len(accounts) == 1:
+                success, _ = self.publish(accounts[0], topic, cleaned_content, image_bytes,
+                                          asset=assets.get(accounts[0].name), image_ref=image_ref, job=job,
+                                          upload_only=upload_only)
+                return success
+
+            # Fan out: each account uploads its own copy (if needed) and posts concurrently
+            with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+                futures = [executor.submit(self.publish, account, topic, cleaned_content, image_bytes,
+                                           asset=assets.get(account.name), image_ref=image_ref, job=job,
+                                           upload_only=upload_only)
+                           for account in accounts]
+                results = [future.result() for future in futures]
+            done = 'prepared' if upload_only else 'posted'
+            for account, (success, elapsed) in zip(accounts, results):
+                logger.info(f"[{account.name}] {done if success else 'FAILED'} in {elapsed:.2f}s")
+            return all(success for success, _ in results)
+
+        except Exception as e:
+            logger.exception(f"Error posting to LinkedIn: {str(e)}")
+            return False
+
+    def load_sheet_cursor(self):
+        """Load the persisted index of the first row that may still need content"""
+        try:
+            if os.path.exists(SHEET_CURSOR_FILE):
+                with open(SHEET_CURSOR_FILE, 'r') as f:
+                    return max(1, int(json.load(f).get(self.spreadsheet_id, 1)))
+            return 1
+        except Exception as e:
+            logger.error(f"Error loading sheet cursor: {str(e)}")
+            return 1
+
+    def save_sheet_cursor(self, row_index):
+        """Persist the index of the first row that may still need content"""
+        try:
+            cursors = {}
+            if os.path.exists(SHEET_CURSOR_FILE):
+                with open(SHEET_CURSOR_FILE, 'r') as f:
+                    cursors = json.load(f)
+            cursors[self.spreadsheet_id] = row_index
+            with open(SHEET_CURSOR_FILE, 'w') as f:
+                json.dump(cursors, f)
+        except Exception as e:
+            logger.error(f"Error saving sheet cursor: {str(e)}")
+
+    def find_pending_rows(self, full_scan=False):
+        """Yield (pending, skipped, end) for each page of rows from the cursor on
+
+        pending lists the page's SheetRow records still needing content,
+        skipped the indices of unfinished rows that cannot be processed as
+        they are (an invalid publish time) and end is the index just past
+        the last row read. Rows without a topic have nothing to do and count
+        as finished. Only the topic, status and publish time columns are
+        read. Rows without a status are checked against the content column
+        individually, so sheets filled in before the status column existed
+        are still handled correctly; those that have content are marked
+        done so later scans skip them.
+        """
+        start = 1 if full_scan else self.load_sheet_cursor()
+        logger.info(f"Scanning spreadsheet for pending topics from row {start + 1}...")
+        values = self.service.spreadsheets().values()
+        scanned = found = 0
+        for page in self.read_spreadsheet(start):
+            candidates = []
+            skipped = []
+            for row in page:
+                if row.status:
+                    continue
+                if not row.topic:
+                    if row.publish_at:
+                        logger.warning(f"Skipping row {row.row_number}: topic name is missing")
+                    continue
+                if row.publish_at:
+                    try:
+                        parse_publish_at(row.publish_at)
+                    except ValueError as e:
+                        logger.warning(f"Skipping row {row.row_number}: {e}")
+                        skipped.append(row.row_index)
+                        continue
+                candidates.append(row)
+
+            # Rows without a status may still have content from before the status column existed
+            pending = []
+            done = []
+            for i in range(0, len(candidates), SHEET_READ_BATCH_RANGES):
+                chunk = candidates[i:i + SHEET_READ_BATCH_RANGES]
+                with self.metrics.stage('sheet_read'):
+                    result = values.batchGet(
+                        spreadsheetId=self.spreadsheet_id,
+                        ranges=[f'Sheet1!B{row.row_number}' for row in chunk]
+                    ).execute()
+                for row, value_range in zip(chunk, result.get('valueRanges', [])):
+                    if not value_range.get('values'):  # Check if content is missing
+                        pending.append(row)
+                    else:
+                        done.append(row)
+            if done:
+                self.mark_rows_done(done)
+            scanned += len(page)
+            found += len(pending)
+            yield pending, skipped, page[-1].row_index + 1
+        logger.info(f"Scanned {scanned} rows, {found} pending")
+
+    def mark_rows_done(self, rows):
+        """Set the status of rows that already have content, in one values.batchUpdate"""
+        data = [{'range': f'Sheet1!{SHEET_STATUS_COLUMN}{row.row_number}', 'values': [[SHEET_STATUS_DONE]]}
+                for row in rows]
+        try:
+            with self.metrics.stage('sheet_write'):
+                self.service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={'valueInputOption': 'RAW', 'data': data}
+                ).execute()
+            logger.info(f"Marked {len(rows)} row(s) that already had content as done")
+        except Exception as e:
+            # Harmless: the rows are checked against their content again on the next scan
+            logger.error(f"Error marking rows {[row.row_number for row in rows]} as done: {e}")
+
+    def load_job(self, row_index, topic):
+        """The job for a row, resumed from the job store if an earlier run left it unfinished"""
+        if self.jobs is None:
+            return Job(None, self.topic_store.source, row_index, topic)
+        return self.jobs.load(self.topic_store.source, row_index, topic)
+
+    def resolve_posts(self, rows, posted):
+        """Settle posts an interrupted run left in flight on the given sheet rows (numbered as in the sheet)
+
+        Posts whose outcome could not be checked are recorded as published
+        with posted, and are created again on this run otherwise.
+        """
+        action = 'marked as published' if posted else 'queued to be posted again'
+        for row in rows:
+            changed = self.jobs.resolve_posting(self.topic_store.source, row - 1, posted)
+            if changed:
+                logger.info(f"Row {row}: {changed} unconfirmed post(s) {action}")
+            else:
+                logger.warning(f"Row {row} has no post waiting to be confirmed")
+
+    def mark_synced(self, rows):
+        """Complete the jobs of rows the topic store has written"""
+        if self.jobs is not None:
+            self.jobs.mark_synced(self.topic_store.source, rows)
+
+    def job_content(self, job):
+        """Generate the job's post unless an earlier run already did"""
+        if job.content is not None:
+            return True
+        logger.info(f"Generating content for topic: {job.topic}")
+        content = self.generate_content(job.topic)
+        if not content:
+            logger.error(f"Failed to generate content for topic: {job.topic}")
+            return False
+        job.advance('generated', content=content)
+        return True
+
+    def job_image(self, job):
+        """Find the job's image unless an earlier run already did"""
+        if job.image_url is not None:
+            return True
+        logger.info(f"Finding image for topic: {job.topic}")
+        image_url = self.find_image(job.topic)
+        if not image_url:
+            logger.error(f"Failed to find image for topic: {job.topic}")
+            return False
+        job.advance('image_resolved', image_url=image_url)
+        return True
+
+    def job_post(self, job):
+        """Post the job to LinkedIn unless it is already posted or posting is off
+
+        A row with a future publish time is only prepared here and handed to
+        the scheduler.
+        """
+        if not self.publish_posts or job.reached('posted'):
+            return True
+        due = self.topic_store.publish_at(job.row_index)
+        if due is not None and due > time.time():
+            return self.schedule_post(job, due)
+        success = self.post_to_linkedin(job.topic, job.content, job.image_url, job=job)
+        if success:
+            job.advance('posted')
+            logger.info(f"Successfully posted content for topic: {job.topic}")
+            if due is not None:
+                self.metrics.observe('publish_lateness', time.time() - due)
+        else:
+            logger.error(f"Failed to post content for topic: {job.topic}")
+        return success
+
+    def schedule_post(self, job, due):
+        """Upload the job's images now and queue the post for its publish time"""
+        when = datetime.datetime.fromtimestamp(due).isoformat(sep=' ', timespec='minutes')
+        logger.info(f"Row {job.row_index + 1} is scheduled for {when}, uploading its image ahead of time...")
+        if not self.post_to_linkedin(job.topic, job.content, job.image_url, job=job, upload_only=True):
+            logger.error(f"Failed to prepare scheduled post for topic: {job.topic}")
+            return False
+        if not self.hold_scheduled or due - time.time() > self.schedule_horizon:
+            # Still pending in the sheet, so a run closer to the time picks the prepared job up again
+            logger.info(f"Row {job.row_index + 1} is prepared and left for a later run")
+            self.deferred += 1
+        elif self.scheduler.add(job, due):
+            logger.info(f"Row {job.row_index + 1} is prepared and waiting for {when}")
+        return True
+
+    def publish_scheduled(self, job, due):
+        """Create the post for a prepared job that has fallen due and update its row"""
+        start = time.time()
+        # The job may have waited for hours; another run could have posted the row meanwhile
+        job.refresh()
+        success = self.post_to_linkedin(job.topic, job.content, job.image_url, job=job)
+        if not success:
+            logger.error(f"Failed to publish scheduled post for topic: {job.topic}")
+            return False
+        lateness = time.time() - due
+        self.metrics.observe('publish_lateness', lateness)
+        logger.info(f"Published scheduled row {job.row_index + 1} ({job.topic}) {lateness:.2f}s after its publish time "
+                    f"(posting took {time.time() - start:.2f}s)")
+        job.advance('posted')
+        return self.job_sync(job)
+
+    def job_sync(self, job):
+        """Write the job's row to the topic store; the job is complete once the write is flushed
+
+        With --no-resume a posted row is flushed right away instead of waiting for the batch.
+        """
+        if self.publish_posts and not job.reached('posted'):
+            return True  # Scheduled: the row is written once the post is published
+        written = self.topic_store.write(job.row_index, job.content, job.image_url)
+        if written and self.dedupe == 'merge':
+            self.complete_duplicates(job.row_index)
+        if written and self.jobs is None and self.publish_posts:
+            # Without the job store the row update is the only record of the post, so it is not buffered:
+            # a crash would leave a posted row pending and the next run would post it again
+            return self.topic_store.flush()
+        return written
+
+    def process_job(self, job):
+        """Run a row's job through generation, image search, posting and the sheet update
+
+        Stages an earlier run completed are not repeated. The sheet is only
+        updated once the post is published, so a row that failed to post is
+        still pending on the next run.
+        """
+        logger.info(f"Processing post for topic: {job.topic}")
+        return self.job_content(job) and self.job_image(job) and self.job_post(job) and self.job_sync(job)
+
+    def process_row(self, row_index, topic):
+        """Generate content and image for a single row, post it to LinkedIn and update the sheet"""
+        return self.process_job(self.load_job(row_index, topic))
+
+    def process_rows(self, pending):
+        """Process (row_index, topic) pairs one after another and return {row_index: success}"""
+        results = {}
+        group_size = max(1, self.generate_batch_size)
+        for i in range(0, len(pending), group_size):
+            jobs = [self.load_job(row_index, topic) for row_index, topic in pending[i:i + group_size]]
+            self.prefetch_content([job.topic for job in jobs if job.content is None])
+            for job in jobs:
+                try:
+                    results[job.row_index] = self.process_job(job)
+                except Exception as e:
+                    logger.exception(f"Error processing row {job.row_index + 1} ({job.topic}): {str(e)}")
+                    results[job.row_index] = False
+        return results
+
+    def pending_batches(self, process_all=False, limit=None, full_scan=False):
+        """Yield the chunks of (row_index, topic) pairs a run should process"""
+        chunks = self.topic_store.pending_chunks(full_scan=full_scan)
+        if not (process_all or limit):
+            # Only the most recent row without content
+            latest = []
+            for chunk in chunks:
+                latest = chunk[-1:]
+            if latest:
+                yield latest
+            return
+
+        index = TopicIndex(self.dedupe_threshold) if self.dedupe != 'off' else None
+        with self._merge_lock:
+            self.merged = {}
+            self.completed = set()
+        remaining = limit
+        for chunk in chunks:
+            selected = []
+            for row_index, topic in chunk:
+                if limit and len(selected) >= remaining:
                     break
-            
-            if not last_row_without_content:
-                print("\nNo new topics found to process")
-                return
-            
-            topic = last_row_without_content[0].strip()
-            if not topic:
-                print("\nError: Topic name is missing in the row")
-                return
-            
-            print(f"\nProcessing post for topic: {topic}")
-            
-            # Generate content
-            print(f"Generating content for topic: {topic}")
-            content = self.generate_content(topic)
-            if not content:
-                print(f"Failed to generate content for topic: {topic}")
+                if index is None or not self.skip_duplicate(index, row_index, topic):
+                    selected.append((row_index, topic))
+            if limit:
+                remaining -= len(selected)
+            if selected:
+                logger.info(f"Batch mode: {len(selected)} pending rows to process")
+                yield selected
+            if limit and remaining <= 0:
                 return
+
+    def skip_duplicate(self, index, row_index, topic):
+        """Check a topic against the run's earlier topics; True if the row should not be processed"""
+        match = index.add(row_index, topic)
+        if match is None:
+            return False
+        original, similarity = match
+        self.duplicates += 1
+        if self.dedupe != 'merge':
+            logger.warning(f"Row {row_index + 1} ({topic}) looks like a duplicate of row {original + 1} "
+                           f"({similarity:.0%} similar)")
+            return False
+        logger.warning(f"Skipping row {row_index + 1} ({topic}): duplicate of row {original + 1} "
+                       f"({similarity:.0%} similar)")
+        # Marked once the original is done; if it fails, both rows are still pending on the next run
+        with self._merge_lock:
+            done = original in self.completed
+            if not done:
+                self.merged.setdefault(original, []).append(row_index)
+        if done:
+            self.topic_store.write(row_index, '', '', status=f"duplicate of row {original + 1}")
+        return True
+
+    def complete_duplicates(self, original):
+        """Mark the rows merged into a row that has just been written as its duplicates"""
+        with self._merge_lock:
+            self.completed.add(original)
+            duplicates = self.merged.pop(original, [])
+        for row_index in duplicates:
+            self.topic_store.write(row_index, '', '', status=f"duplicate of row {original + 1}")
+
+    def process_spreadsheet_and_post(self, process_all=False, limit=None, pipeline=None, full_scan=False,
+                                     wait_for_schedule=False):
+        """Process pending topics from the topic store and post them to LinkedIn
+
+        By default only the most recent row without content is handled. With
+        process_all (or a limit) every pending row is processed in order, one
+        chunk from the store at a time, and a failing row does not stop the
+        others. Passing a PostPipeline runs each chunk through its concurrent
+        stages. In the Google Sheet only rows past the persisted cursor are
+        scanned unless full_scan is set. Rows with a future publish time are
+        prepared; with hold_scheduled they are queued on the scheduler, and
+        wait_for_schedule publishes them as they fall due before returning.
+        """
+        try:
+            start_time = time.time()
+            processed = 0
+            succeeded = 0
+            failed = []
+            self.deferred = 0
+            published_before = self.scheduler.published
+            failed_before = len(self.scheduler.failed)
+            try:
+                for chunk in self.pending_batches(process_all=process_all, limit=limit, full_scan=full_scan):
+                    if pipeline is not None:
+                        results = pipeline.run(chunk)
+                    else:
+                        results = self.process_rows(chunk)
+                    for row_index, _ in chunk:
+                        if results.get(row_index):
+                            succeeded += 1
+                        else:
+                            failed.append(row_index + 1)
+                    processed += len(chunk)
+                if wait_for_schedule and len(self.scheduler):
+                    logger.info(f"Waiting to publish {len(self.scheduler)} scheduled posts...")
+                    self.scheduler.wait()
+            finally:
+                # Write out any row updates still sitting in the buffer
+                self.topic_store.flush()
+            elapsed = time.time() - start_time
+            self.topic_store.finish()
+
+            if not processed:
+                logger.info("No new topics found to process")
+            elif processed > 1:
+                rate = processed / elapsed if elapsed > 0 else 0.0
+                logger.info("Batch summary:")
+                logger.info(f"Rows processed: {processed}")
+                logger.info(f"Succeeded: {succeeded}")
+                logger.info(f"Failed: {len(failed)}" + (f" (rows {failed})" if failed else ""))
+                logger.info(f"Elapsed: {elapsed:.1f}s ({rate:.3f} rows/sec)")
+            published = self.scheduler.published - published_before
+            failed_scheduled = self.scheduler.failed[failed_before:]
+            if published or failed_scheduled or self.deferred:
+                logger.info(f"Scheduled posts: {published} published, {len(failed_scheduled)} failed"
+                            + (f" (rows {failed_scheduled})" if failed_scheduled else "")
+                            + f", {self.deferred} prepared for a later run")
             
-            # Find image
-            print(f"Finding image for topic: {topic}")
-            image_url = self.find_image(topic)
-            if not image_url:
-                print(f"Failed to find image for topic: {topic}")
-                return
-            
-            # Update spreadsheet with new content and image
-            row_index = values.index(last_row_without_content)
-            print(f"Updating spreadsheet row {row_index + 1}...")
-            update_range = f'Sheet1!B{row_index + 1}:C{row_index + 1}'
-            update_values = [[content, image_url]]
-            body = {
-                'values': update_values
-            }
-            result = sheet.values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=update_range,
-                valueInputOption='RAW',
-                body=body
-            ).execute()
-            print("Successfully updated spreadsheet with content and image URL")
-            
-            # Verify the update
-            result = sheet.values().get(
+        except Exception as e:
+            logger.exception(f"Error processing spreadsheet: {str(e)}")
+
+    def poll_sheet(self):
+        """Return a cheap marker for the rows past the cursor: (row count, topics hash)"""
+        start = self.load_sheet_cursor()
+        with self.metrics.stage('sheet_read'):
+            result = self.service.spreadsheets().values().get(
                 spreadsheetId=self.spreadsheet_id,
-                range=f'Sheet1!A{row_index + 1}:C{row_index + 1}'
+                range=f'Sheet1!A{start + 1}:A'
             ).execute()
-            updated_row = result.get('values', [[]])[0]
-            print("\nUpdated row data:")
-            print(f"Topic: {updated_row[0]}")
-            print(f"Content: {updated_row[1][:100]}...")  # Show first 100 chars of content
-            print(f"Image URL: {updated_row[2]}")
-            
-            # Post to LinkedIn
-            print("\nPreparing LinkedIn post...")
-            success = self.post_to_linkedin(topic, content, image_url)
-            if success:
-                print(f"Successfully posted content for topic: {topic}")
-            else:
-                print(f"Failed to post content for topic: {topic}")
-            
-        except Exception as e:
-            print(f"Error processing spreadsheet: {str(e)}")
-            traceback.print_exc()
+        topics = result.get('values', [])
+        digest = hashlib.sha256(json.dumps(topics).encode('utf-8')).hexdigest()
+        return start + len(topics), digest
+
+    def write_profiles(self):
+        """Write the per-stage profiles collected with --profile"""
+        profiler = self.metrics.profiler
+        if profiler is None:
+            return
+        stages = profiler.write()
+        logger.info(f"Profiles for {len(stages)} stages written to {profiler.output_dir}: {', '.join(stages)}")
+        if profiler.unprofiled:
+            logger.warning(f"{profiler.unprofiled} stage runs were not CPU profiled because another "
+                           f"profiler was active (Python 3.12+ allows one at a time)")
+
+    def run_daemon(self, poll_interval=DAEMON_POLL_INTERVAL, retry_interval=DAEMON_RETRY_INTERVAL, pipeline=None):
+        """Keep clients warm and process new rows whenever the sheet changes"""
+        logger.info("Starting LinkedIn Post Generator in daemon mode...")
+        self.get_google_sheets_service()
+        self.token_manager.start()
+        self.model  # Build the Gemini model up front so the first row does not pay for it
+        self.hold_scheduled = True  # Scheduled posts are published between polls
+
+        marker = None
+        last_run = 0.0
+        try:
+            while True:
+                try:
+                    current = self.poll_sheet()
+                    if current != marker or time.monotonic() - last_run >= retry_interval:
+                        logger.info(f"Sheet changed ({current[0]} rows), processing pending topics...")
+                        self.process_spreadsheet_and_post(process_all=True, pipeline=pipeline)
+                        last_run = time.monotonic()
+                        if self.metrics_file:
+                            self.metrics.write_json(self.metrics_file)
+                        self.write_profiles()
+                        # The cursor may have moved, so take the marker after processing
+                        current = self.poll_sheet()
+                    marker = current
+                    self.scheduler.publish_due()
+                except Exception as e:
+                    logger.exception(f"Error in daemon loop: {e}")
+                # Wake up early for the next scheduled post
+                due = self.scheduler.next_due()
+                time.sleep(poll_interval if due is None else min(poll_interval, max(0.0, due - time.time())))
+        except KeyboardInterrupt:
+            logger.info("Stopping daemon...")
+        finally:
+            self.token_manager.stop()
+            self.sheet_writer.flush()
+            self.write_profiles()
+            if self.image_pool is not None:
+                self.image_pool.shutdown()
+            self.close_stores()
 
-    def run(self):
-        """Main execution method"""
+    def run(self, process_all=False, limit=None, pipeline=None, full_scan=False, wait_for_schedule=False):
+        """Main execution method; wait_for_schedule keeps running until posts due within the horizon are published"""
         try:
-            print("Starting LinkedIn Post Generator...")
+            logger.info("Starting LinkedIn Post Generator...")
             
-            # Get Google Sheets service
-            self.get_google_sheets_service()
+            # Connect to the Google Sheet (or check the local topics file)
+            self.topic_store.open()
+            self.token_manager.start()
             
             # Process spreadsheet and post content
-            self.process_spreadsheet_and_post()
+            self.hold_scheduled = wait_for_schedule
+            self.process_spreadsheet_and_post(process_all=process_all, limit=limit, pipeline=pipeline,
+                                              full_scan=full_scan, wait_for_schedule=wait_for_schedule)
+
+            if self.content_cache is not None:
+                stats = self.content_cache.stats()
+                logger.info(f"Content cache: {stats['hits']} hits, {stats['misses']} misses "
+                            f"({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evictions, "
+                            f"{stats['entries']} entries")
+
+            if self.duplicates:
+                action = 'skipped' if self.dedupe == 'merge' else 'flagged'
+                logger.info(f"Near-duplicate topics: {self.duplicates} {action}")
+
+            if self.jobs is not None and self.jobs.stats['resumed']:
+                stats = self.jobs.stats
+                logger.info(f"Resumed {stats['resumed']} unfinished rows: skipped {stats['generations']} generations, "
+                            f"{stats['images']} image searches, {stats['uploads']} uploads and {stats['posts']} posts")
+
+            usage = self.gemini_usage
+            if usage.calls:
+                topic, cost = usage.most_expensive()
+                logger.info(f"Gemini: {usage.calls} requests, {usage.prompt_tokens} prompt + {usage.output_tokens} "
+                            f"output tokens{f' ({usage.estimated} requests estimated)' if usage.estimated else ''}, "
+                            f"${usage.cost:.4f} (${usage.cost / len(usage.topics):.4f} per topic, "
+                            f"most expensive: {topic} at ${cost:.4f})")
+            budget = self.gemini_budget
+            if budget.throttled_requests or budget.quota_errors:
+                logger.info(f"Gemini throttling: {budget.throttled_requests} requests waited "
+                            f"{budget.throttled_seconds:.2f}s for the budget, {budget.quota_errors} quota errors retried")
+
+            if self.generate_stats['batch_requests']:
+                stats = self.generate_stats
+                logger.info(f"Batched generation: {stats['batched_topics']} posts from {stats['batch_requests']} requests, "
+                            f"{stats['fallbacks']} generated one by one after failing validation")
+
+            if self.accounts:
+                logger.info("LinkedIn accounts:")
+                for name, stats in self.account_stats.items():
+                    attempts = stats['posts'] + stats['failures']
+                    logger.info(f"  {name}: {stats['posts']} posted, {stats['failures']} failed, "
+                                f"{stats['seconds'] / attempts:.2f}s average")
+
+            if self.unsplash_stats['images'] or self.unsplash_stats['calls']:
+                stats = self.unsplash_stats
+                logger.info(f"Unsplash: {stats['calls']} API calls for {stats['images']} images "
+                            f"({stats['cached']} from cache, {stats['shared']} shared with similar topics)")
+
+            if self.asset_index is not None:
+                stats = self.asset_index.stats()
+                logger.info(f"Image assets: {stats['url_hits']} reused by URL, {stats['hash_hits']} reused by content, "
+                            f"{stats['misses']} uploaded ({stats['hit_rate']:.0%} hit rate)")
+
+            logger.info("Stage timings:")
+            self.metrics.log_summary()
+            if self.metrics_file:
+                self.metrics.write_json(self.metrics_file)
+                logger.info(f"Metrics written to {self.metrics_file}")
+            self.write_profiles()
+
+            if self.image_stats['images']:
+                stats = self.image_stats
+                logger.info(f"Images: {stats['images']} processed, {stats['bytes_in'] - stats['bytes_out']} bytes saved "
+                            f"({stats['bytes_in']} -> {stats['bytes_out']}), {stats['encode_seconds']:.2f}s encoding")
             
-            print("\nAll posts processed successfully!")
+            logger.info("All posts processed successfully!")
             
         except Exception as e:
-            print(f"Error in main execution: {e}")
-            print("Traceback:")
-            traceback.print_exc()
+            logger.exception(f"Error in main execution: {e}")
             sys.exit(1)
+        finally:
+            self.token_manager.stop()
+            if self.image_pool is not None:
+                self.image_pool.shutdown()
+            self.close_stores()
+
+    def close_stores(self):
+        """Close the on-disk caches and the job store at the end of a run"""
+        for store in (self.content_cache, self.asset_index, self.image_cache, self.jobs):
+            if store is not None:
+                store.close()
+
+class PostPipeline:
+    """Asyncio pipeline that runs rows through generate -> image -> post -> sheet stages.
+
+    Each stage has its own pool of workers and hands work to the next stage
+    through a bounded queue, so a fast stage blocks once the queue is full
+    instead of piling up work in memory. The blocking agent methods run in a
+    thread pool, which lets Gemini generation for one row overlap with the
+    LinkedIn upload of another.
+    """
+
+    STAGES = ('generate', 'image', 'post', 'sheet')
+
+    def __init__(self, agent, concurrency=None, queue_size=PIPELINE_QUEUE_SIZE):
+        self.agent = agent
+        self.concurrency = dict(PIPELINE_CONCURRENCY)
+        self.concurrency.update(concurrency or {})
+        self.queue_size = queue_size
+        self.results = {}
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _generate(self, job):
+        return await self._call(self.agent.job_content, job)
+
+    async def _image(self, job):
+        return await self._call(self.agent.job_image, job)
+
+    async def _post(self, job):
+        return await self._call(self.agent.job_post, job)
+
+    async def _sheet(self, job):
+        return await self._call(self.agent.job_sync, job)
+
+    async def _next_jobs(self, stage, inbox):
+        """Take the next job or, for batched generation, as many queued jobs as fit in one batch"""
+        jobs = [await inbox.get()]
+        if stage == 'generate':
+            while len(jobs) < self.agent.generate_batch_size and jobs[-1] is not None and not inbox.empty():
+                jobs.append(inbox.get_nowait())
+        return jobs
+
+    async def _worker(self, stage, inbox, outbox):
+        handler = getattr(self, f'_{stage}')
+        while True:
+            jobs = await self._next_jobs(stage, inbox)
+            topics = [job.topic for job in jobs if job is not None and job.content is None]
+            if len(topics) > 1:
+                await self._call(self.agent.prefetch_content, topics)
+            for job in jobs:
+                if job is None:
+                    inbox.task_done()
+                    return
+                try:
+                    ok = await handler(job)
+                except Exception as e:
+                    logger.exception(f"Error in {stage} stage for row {job.row_index + 1} ({job.topic}): {str(e)}")
+                    ok = False
+                if not ok:
+                    self.results[job.row_index] = False
+                elif outbox is not None:
+                    await outbox.put(job)  # Blocks while the next stage is saturated
+                else:
+                    self.results[job.row_index] = True
+                inbox.task_done()
+
+    async def _run_stage(self, stage, inbox, outbox):
+        workers = [asyncio.create_task(self._worker(stage, inbox, outbox))
+                   for _ in range(max(1, self.concurrency[stage]))]
+        await asyncio.gather(*workers)
+        if outbox is not None:
+            # Let every worker of the next stage shut down
+            for _ in range(max(1, self.concurrency[self.STAGES[self.STAGES.index(stage) + 1]])):
+                await outbox.put(None)
+
+    async def _run(self, pending):
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.STAGES]
+        # Let batched generation gather a full batch from its inbox
+        queues[0] = asyncio.Queue(maxsize=max(self.queue_size, self.agent.generate_batch_size))
+        stages = []
+        for i, stage in enumerate(self.STAGES):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            stages.append(asyncio.create_task(self._run_stage(stage, queues[i], outbox)))
+        for row_index, topic in pending:
+            await queues[0].put(self.agent.load_job(row_index, topic))
+        for _ in range(max(1, self.concurrency[self.STAGES[0]])):
+            await queues[0].put(None)
+        await asyncio.gather(*stages)
+
+    def run(self, pending):
+        """Process (row_index, topic) pairs and return {row_index: success}"""
+        workers = sum(max(1, n) for n in self.concurrency.values())
+        self.results = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            self._executor = executor
+            asyncio.run(self._run(pending))
+        return self.results
+
+def run_startup_benchmark():
+    """Report how long each heavy import and each client initialization takes"""
+    timings = []
+
+    def timed(label, func):
+        start = time.perf_counter()
+        result = func()
+        timings.append((label, time.perf_counter() - start))
+        return result
+
+    for module in STARTUP_BENCHMARK_MODULES:
+        if module in sys.modules:
+            logger.warning(f"Note: {module} was already imported, its time is not representative")
+        timed(f"import {module}", lambda: importlib.import_module(module))
+
+    agent = timed("LinkedInAgent()", LinkedInAgent)
+    timed("Gemini model", lambda: agent.model)
+    timed("Google Sheets service", agent.get_google_sheets_service)
+
+    print("\nStartup benchmark:")
+    width = max(len(label) for label, _ in timings)
+    for label, seconds in timings:
+        print(f"  {label:<{width}}  {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<{width}}  {sum(seconds for _, seconds in timings) * 1000:8.1f} ms")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Generate and post LinkedIn content from a Google Sheet')
+    parser.add_argument('--all', action='store_true', dest='process_all',
+                        help='process every pending row instead of only the most recent one')
+    parser.add_argument('--limit', type=int, default=None, metavar='N',
+                        help='process at most N pending rows (implies --all)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='run the batch through the concurrent asyncio pipeline')
+    parser.add_argument('--generate-batch', type=int, default=GENERATE_BATCH_SIZE, metavar='K',
+                        help='generate posts for up to K topics per Gemini request (1 disables batching)')
+    parser.add_argument('--dedupe', choices=['off', 'flag', 'merge'], default='flag',
+                        help='in batch mode, warn about near-duplicate topics (flag) or skip them and '
+                             'mark them as duplicates in the sheet (merge)')
+    parser.add_argument('--dedupe-threshold', type=float, default=TOPIC_SIMILARITY_THRESHOLD, metavar='S',
+                        help='similarity (0-1) above which two topics count as near-duplicates')
+    parser.add_argument('--generate-workers', type=int, default=PIPELINE_CONCURRENCY['generate'], metavar='N',
+                        help='concurrent Gemini generations in pipeline mode')
+    parser.add_argument('--image-workers', type=int, default=PIPELINE_CONCURRENCY['image'], metavar='N',
+                        help='concurrent Unsplash lookups in pipeline mode')
+    parser.add_argument('--post-workers', type=int, default=PIPELINE_CONCURRENCY['post'], metavar='N',
+                        help='concurrent LinkedIn posts in pipeline mode')
+    parser.add_argument('--queue-size', type=int, default=PIPELINE_QUEUE_SIZE, metavar='N',
+                        help='maximum rows waiting between two pipeline stages')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always call Gemini instead of reusing cached content')
+    parser.add_argument('--no-image-processing', action='store_true',
+                        help='upload Unsplash images as downloaded instead of resizing them')
+    parser.add_argument('--image-format', choices=['JPEG', 'WEBP'], default=IMAGE_FORMAT, type=str.upper,
+                        help='encoding used for uploaded images')
+    parser.add_argument('--image-quality', type=int, default=IMAGE_QUALITY, metavar='Q',
+                        help='JPEG/WebP quality (1-95) for uploaded images')
+    parser.add_argument('--full-scan', action='store_true',
+                        help='scan the whole sheet for pending rows instead of starting at the saved cursor')
+    parser.add_argument('--verify-writes', action='store_true',
+                        help='read updated rows back from the sheet after each batch write')
+    parser.add_argument('--startup-benchmark', action='store_true',
+                        help='report import and initialization time per component, then exit')
+    parser.add_argument('--no-asset-reuse', action='store_true',
+                        help='upload every image again instead of reusing previously uploaded assets')
+    parser.add_argument('--wait-for-schedule', action='store_true',
+                        help='keep running until scheduled posts due within the horizon are published '
+                             '(by default they are only prepared, and daemon mode publishes them between polls)')
+    parser.add_argument('--schedule-horizon', type=float, default=SCHEDULE_HORIZON / 3600, metavar='HOURS',
+                        help='with --daemon or --wait-for-schedule, hold scheduled posts due within this many '
+                             'hours; later ones are only prepared')
+    parser.add_argument('--gemini-rpm', type=float, metavar='N',
+                        help='pace Gemini requests to at most N per minute (default: unlimited)')
+    parser.add_argument('--gemini-tpm', type=int, metavar='N',
+                        help='pace Gemini requests to at most N tokens per minute (default: unlimited)')
+    parser.add_argument('--no-image-cache', action='store_true',
+                        help='do not keep Unsplash search results between runs')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='do not record per-row progress or resume rows an earlier run left unfinished')
+    parser.add_argument('--mark-posted', type=int, action='append', default=[], metavar='ROW',
+                        help='record the post of a row whose posting was interrupted as published, after '
+                             'checking LinkedIn by hand (repeatable)')
+    parser.add_argument('--repost', type=int, action='append', default=[], metavar='ROW',
+                        help='post a row whose posting was interrupted again, after checking LinkedIn by hand '
+                             '(repeatable)')
+    parser.add_argument('--accounts', metavar='FILE',
+                        help='JSON list of LinkedIn accounts to publish every post to')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        type=str.upper, help='minimum level of log messages to show')
+    parser.add_argument('--quiet', action='store_true',
+                        help='only log warnings and errors (same as --log-level WARNING)')
+    parser.add_argument('--log-json', action='store_true',
+                        help='write logs as JSON lines')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='serve Prometheus metrics on /metrics and a JSON snapshot on /metrics.json')
+    parser.add_argument('--metrics-host', default=METRICS_HOST, metavar='HOST',
+                        help=f'address the metrics server listens on (default: {METRICS_HOST}; '
+                             f'use 0.0.0.0 to allow remote scraping)')
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help='write a JSON snapshot of per-stage metrics to FILE after each run')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='profile every stage with cProfile and tracemalloc and write <stage>.pstats '
+                             'and <stage>.alloc.txt to DIR after each run')
+    parser.add_argument('--profile-only', choices=['cpu', 'memory'],
+                        help='with --profile, collect only CPU profiles or only allocation diffs')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP, metavar='N',
+                        help='allocation sites listed per stage with --profile')
+    parser.add_argument('--topics', metavar='FILE',
+                        help='read topics from a local CSV or Parquet file instead of the Google Sheet')
+    parser.add_argument('--output', metavar='FILE',
+                        help='CSV or Parquet file for results of --topics (default: <topics>_posts.<ext>)')
+    parser.add_argument('--no-post', action='store_true',
+                        help='generate content and find images without posting to LinkedIn')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running, polling the sheet and posting new topics as they appear')
+    parser.add_argument('--poll-interval', type=float, default=DAEMON_POLL_INTERVAL, metavar='SECONDS',
+                        help='seconds between sheet polls in daemon mode')
+    parser.add_argument('--posts-per-minute', type=float, default=POSTS_PER_MINUTE, metavar='N',
+                        help='sustained LinkedIn posting rate')
+    parser.add_argument('--post-burst', type=int, default=POST_BURST, metavar='N',
+                        help='number of posts that may be published back to back')
+    args = parser.parse_args()
+    if args.poll_interval <= 0 or args.posts_per_minute <= 0 or args.post_burst < 1:
+        parser.error('--poll-interval, --posts-per-minute and --post-burst must be positive')
+    if not 1 <= args.image_quality <= 95:
+        parser.error('--image-quality must be between 1 and 95')
+    if not 0 < args.dedupe_threshold <= 1:
+        parser.error('--dedupe-threshold must be between 0 and 1')
+    if args.output and not args.topics:
+        parser.error('--output requires --topics')
+    if args.daemon and args.topics:
+        parser.error('--daemon only works with the Google Sheet, not --topics')
+    if args.schedule_horizon < 0:
+        parser.error('--schedule-horizon must not be negative')
+    if (args.mark_posted or args.repost) and args.no_resume:
+        parser.error('--mark-posted and --repost need the job store, so they cannot be used with --no-resume')
+    if args.limit is not None and args.limit < 1:
+        parser.error('--limit must be a positive integer')
+    for option in ('generate_batch', 'generate_workers', 'image_workers', 'post_workers', 'queue_size'):
+        if getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} must be a positive integer")
+    return args
 
 if __name__ == "__main__":
-    agent = LinkedInAgent()
-    agent.run() 
\ No newline at end of file
+    args = parse_args()
+    configure_logging('WARNING' if args.quiet else args.log_level, json_format=args.log_json)
+    if args.startup_benchmark:
+        run_startup_benchmark()
+        sys.exit(0)
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler(args.profile, cpu=args.profile_only != 'memory',
+                                 memory=args.profile_only != 'cpu', top=args.profile_top)
+    agent = LinkedInAgent(use_cache=not args.no_cache, process_images=not args.no_image_processing,
+                          image_format=args.image_format, image_quality=args.image_quality,
+                          verify_writes=args.verify_writes, posts_per_minute=args.posts_per_minute,
+                          post_burst=args.post_burst, accounts_file=args.accounts,
+                          reuse_assets=not args.no_asset_reuse, metrics_file=args.metrics_file,
+                          topics_file=args.topics, topics_output=args.output, publish_posts=not args.no_post,
+                          generate_batch_size=args.generate_batch, dedupe=args.dedupe,
+                          dedupe_threshold=args.dedupe_threshold, resume_jobs=not args.no_resume,
+                          keep_image_cache=not args.no_image_cache,
+                          schedule_horizon=args.schedule_horizon * 3600,
+                          gemini_rpm=args.gemini_rpm, gemini_tpm=args.gemini_tpm, profiler=profiler)
+    agent.resolve_posts(args.mark_posted, posted=True)
+    agent.resolve_posts(args.repost, posted=False)
+    if args.metrics_port:
+        start_metrics_server(agent.metrics, args.metrics_port, args.metrics_host)
+    pipeline = None
+    if args.pipeline:
+        pipeline = PostPipeline(agent, concurrency={
+            'generate': args.generate_workers,
+            'image': args.image_workers,
+            'post': args.post_workers,
+        }, queue_size=args.queue_size)
+    if args.daemon:
+        agent.run_daemon(poll_interval=args.poll_interval, pipeline=pipeline)
+    else:
+        agent.run(process_all=args.process_all or args.pipeline, limit=args.limit, pipeline=pipeline,
+                  full_scan=args.full_scan, wait_for_schedule=args.wait_for_schedule)
@@ -0,0 +1,49 @@
+"""AssetIndex: an image LinkedIn already has is posted again without another upload."""
+import pytest
+
+import linkedin_agent
+from linkedin_agent import AssetIndex
+
+OWNER = 'urn:li:person:test'
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = AssetIndex(str(tmp_path / 'asset_index.sqlite3'), ttl=3600)
+    yield index
+    index.close()
+
+
+def test_assets_are_found_by_url_and_by_content(index):
+    index.add(OWNER, 'hash-1', 'https://images.unsplash.com/photo-1', 'urn:li:digitalmediaAsset:1')
+    assert index.find_by_url(OWNER, 'https://images.unsplash.com/photo-1') == 'urn:li:digitalmediaAsset:1'
+    assert index.find_by_hash(OWNER, 'hash-1') == 'urn:li:digitalmediaAsset:1'
+    assert index.find_by_hash(OWNER, 'hash-2') is None
+    assert index.stats() == {'url_hits': 1, 'hash_hits': 1, 'misses': 1, 'hit_rate': 2 / 3}
+
+
+def test_assets_belong_to_their_owner(index):
+    index.add(OWNER, 'hash-1', 'https://images.unsplash.com/photo-1', 'urn:li:digitalmediaAsset:1')
+    assert index.find_by_url('urn:li:organization:1', 'https://images.unsplash.com/photo-1') is None
+    assert index.find_by_hash('urn:li:organization:1', 'hash-1') is None
+
+
+def test_expired_and_discarded_assets_are_not_reused(index, monkeypatch):
+    index.add(OWNER, 'hash-1', None, 'urn:li:digitalmediaAsset:1')
+    index.add(OWNER, 'hash-2', None, 'urn:li:digitalmediaAsset:2')
+    index.discard(OWNER, 'urn:li:digitalmediaAsset:2')
+    assert index.find_by_hash(OWNER, 'hash-2') is None
+
+    now = linkedin_agent.time.time()
+    monkeypatch.setattr(linkedin_agent.time, 'time', lambda: now + 3601)
+    assert index.find_by_hash(OWNER, 'hash-1') is None
+
+
+@pytest.mark.parametrize('reuse_assets, uploads', [(True, 1), (False, 2)])
+def test_same_image_is_uploaded_once(server, make_agent, reuse_assets, uploads):
+    server.image_pool = 1  # Every search returns the same photo, under a different URL per topic
+    sheet = [['Topic', 'Content', 'Image', 'Status'], ['Remote Work Culture'], ['Quantum Computing Basics']]
+    make_agent(sheet, reuse_assets=reuse_assets).process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 2
+    assert server.requests['registerUpload']['calls'] == uploads
+    assert sheet[1][2] != sheet[2][2]
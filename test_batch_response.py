@@ -0,0 +1,39 @@
+"""LinkedInAgent.parse_batch_response: a batched reply is split per topic, invalid entries are left out."""
+import json
+
+from linkedin_agent import GENERATE_BATCH_MIN_CHARS, LinkedInAgent
+
+parse = LinkedInAgent.parse_batch_response
+
+POST = "Remote work is changing how teams collaborate. " * 4
+TOPICS = ['Remote Work Culture', 'AI in Marketing']
+
+
+def test_plain_json_object():
+    reply = json.dumps({topic: POST for topic in TOPICS})
+    assert parse(reply, TOPICS) == {topic: POST.strip() for topic in TOPICS}
+
+
+def test_json_fence_is_stripped():
+    reply = "```json\n" + json.dumps({TOPICS[0]: POST}) + "\n```"
+    assert parse(reply, TOPICS) == {TOPICS[0]: POST.strip()}
+
+
+def test_object_inside_prose_is_found():
+    reply = "Here are your posts:\n" + json.dumps({TOPICS[1]: POST}) + "\nEnjoy!"
+    assert parse(reply, TOPICS) == {TOPICS[1]: POST.strip()}
+
+
+def test_keys_match_regardless_of_case_and_spacing():
+    reply = json.dumps({'remote  work CULTURE ': POST})
+    assert parse(reply, TOPICS) == {TOPICS[0]: POST.strip()}
+
+
+def test_short_and_non_text_entries_are_left_out():
+    reply = json.dumps({TOPICS[0]: 'x' * (GENERATE_BATCH_MIN_CHARS - 1), TOPICS[1]: ['not', 'a', 'post']})
+    assert parse(reply, TOPICS) == {}
+
+
+def test_unparseable_reply_gives_nothing():
+    assert parse("Sorry, I can't help with that.", TOPICS) == {}
+    assert parse(json.dumps([POST, POST]), TOPICS) == {}
@@ -0,0 +1,82 @@
+"""ContentCache: generated posts are reused until they expire, and the least recently used go first."""
+import pytest
+
+import linkedin_agent
+from linkedin_agent import ContentCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake wall clock, moved forward by hand"""
+    class Clock:
+        now = 1_700_000_000.0
+
+    clock = Clock()
+    monkeypatch.setattr(linkedin_agent.time, 'time', lambda: clock.now)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'content_cache.sqlite3')
+
+
+def test_entries_survive_a_restart(clock, path):
+    cache = ContentCache(path)
+    key = ContentCache.make_key('models/gemini-1.5-pro', 'Write a post about AI')
+    assert cache.get(key) is None
+    cache.put(key, 'A post about AI')
+    cache.close()
+
+    cache = ContentCache(path)
+    assert cache.get(key) == 'A post about AI'
+    assert cache.stats()['hits'] == 1
+    assert ContentCache.make_key('models/gemini-1.5-flash', 'Write a post about AI') != key
+
+
+def test_expired_entries_are_misses(clock, path):
+    cache = ContentCache(path, ttl=3600)
+    cache.put('key', 'post')
+    clock.now += 3599
+    assert cache.get('key') == 'post'
+    clock.now += 2
+    assert cache.get('key') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock, path):
+    cache = ContentCache(path, max_entries=2)
+    for key in ('a', 'b'):
+        cache.put(key, f'post {key}')
+        clock.now += 1
+    assert cache.get('a') == 'post a'  # Now more recent than b
+    clock.now += 1
+    cache.put('c', 'post c')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'post a'
+    assert cache.get('c') == 'post c'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_size_limit_evicts_until_under_it(clock, path):
+    cache = ContentCache(path, max_bytes=25)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key * 10)
+        clock.now += 1
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['evictions']) == (2, 20, 1)
+    assert cache.get('a') is None
+
+
+def test_cached_posts_skip_gemini(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status'], ['Remote Work Culture']]
+    agent = make_agent(sheet, use_cache=True, resume_jobs=False)
+    agent.process_spreadsheet_and_post()
+    assert agent.model.calls == 1
+
+    sheet[1] = ['Remote Work Culture']
+    agent = make_agent(sheet, use_cache=True, resume_jobs=False)
+    agent.process_spreadsheet_and_post(full_scan=True)
+    assert agent.model.calls == 0
+    assert sheet[1][3] == linkedin_agent.SHEET_STATUS_DONE
+    assert server.posts == 2
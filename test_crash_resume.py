@@ -0,0 +1,80 @@
+"""A run killed right after creating a post must not post the row again on the next run."""
+import pytest
+
+import linkedin_agent
+
+
+@pytest.fixture
+def sheet():
+    return [['Topic', 'Content', 'Image', 'Status'], ['Remote Work Culture']]
+
+
+def crashed_run(server, make_agent, sheet):
+    """Run until the post has been created, then die before its outcome is recorded"""
+    agent = make_agent(sheet)
+    create_post = agent.create_post
+
+    def create_and_die(*args, **kwargs):
+        create_post(*args, **kwargs)
+        raise KeyboardInterrupt
+
+    agent.create_post = create_and_die
+    with pytest.raises(KeyboardInterrupt):
+        agent.process_spreadsheet_and_post()
+    assert server.posts == 1
+    assert len(sheet[1]) == 1  # Still pending
+
+
+def test_resume_finds_the_interrupted_post(server, make_agent, sheet):
+    server.post_lookup = True
+    crashed_run(server, make_agent, sheet)
+
+    make_agent(sheet).process_spreadsheet_and_post()
+    assert server.posts == 1
+    assert sheet[1][3] == linkedin_agent.SHEET_STATUS_DONE
+
+
+def test_unreadable_posts_wait_for_mark_posted(server, make_agent, sheet):
+    crashed_run(server, make_agent, sheet)
+
+    for _ in range(2):
+        make_agent(sheet).process_spreadsheet_and_post()
+        assert server.posts == 1
+        assert len(sheet[1]) == 1
+
+    agent = make_agent(sheet)
+    agent.resolve_posts([2], posted=True)
+    agent.process_spreadsheet_and_post()
+    assert server.posts == 1
+    assert sheet[1][3] == linkedin_agent.SHEET_STATUS_DONE
+
+
+def test_repost_after_unreadable_posts(server, make_agent, sheet):
+    crashed_run(server, make_agent, sheet)
+
+    agent = make_agent(sheet)
+    agent.resolve_posts([2], posted=False)
+    agent.process_spreadsheet_and_post()
+    assert server.posts == 2
+    assert sheet[1][3] == linkedin_agent.SHEET_STATUS_DONE
+
+
+def test_posted_rows_are_written_at_once_without_job_store(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status'], ['Remote Work Culture'], ['Quantum Computing Basics']]
+    agent = make_agent(sheet, resume_jobs=False)
+    create_post = agent.create_post
+    posted = []
+    written_before_second = []
+
+    def create_and_die_on_second(*args, **kwargs):
+        if posted:
+            written_before_second.extend(sheet[1][3:])
+            raise KeyboardInterrupt
+        posted.append(create_post(*args, **kwargs))
+        return posted[-1]
+
+    agent.create_post = create_and_die_on_second
+    with pytest.raises(KeyboardInterrupt):
+        agent.process_spreadsheet_and_post(process_all=True)
+    # Checked when the second post went out, as a killed run never reaches its final flush
+    assert written_before_second == [linkedin_agent.SHEET_STATUS_DONE]
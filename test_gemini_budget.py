@@ -0,0 +1,72 @@
+"""GeminiBudget: requests wait until they fit the per-minute request and token budgets."""
+import pytest
+
+import linkedin_agent
+from linkedin_agent import GeminiBudget
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock that sleeping advances instead of blocking"""
+    class Clock:
+        now = 1000.0
+
+        def sleep(self, seconds):
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr(linkedin_agent.time, 'monotonic', lambda: clock.now)
+    monkeypatch.setattr(linkedin_agent.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_unlimited_budget_never_waits(clock):
+    budget = GeminiBudget()
+    assert [budget.acquire(10000)[1] for _ in range(100)] == [0.0] * 100
+
+
+def test_requests_per_minute(clock):
+    budget = GeminiBudget(rpm=2)
+    assert budget.acquire(1)[1] == 0.0
+    clock.now += 10
+    assert budget.acquire(1)[1] == 0.0
+    # The third request waits until the first leaves the window
+    assert budget.acquire(1)[1] == pytest.approx(50.0)
+    assert budget.throttled_requests == 1
+
+
+def test_tokens_per_minute(clock):
+    budget = GeminiBudget(tpm=1000)
+    budget.acquire(600)
+    clock.now += 20
+    budget.acquire(300)
+    assert budget.acquire(300)[1] == pytest.approx(40.0)
+
+
+def test_request_larger_than_the_budget_waits_for_an_empty_window(clock):
+    budget = GeminiBudget(tpm=1000)
+    budget.acquire(100)
+    clock.now += 30
+    assert budget.acquire(5000)[1] == pytest.approx(30.0)
+    # Alone in the window it goes out immediately
+    clock.now += 60
+    assert budget.acquire(5000)[1] == 0.0
+
+
+def test_record_corrects_the_estimate(clock):
+    budget = GeminiBudget(tpm=1000)
+    event, _ = budget.acquire(900)
+    budget.record(event, 100)
+    assert budget.tokens == 100
+    assert budget.acquire(800)[1] == 0.0
+
+
+def test_backoff_pauses_and_halves_the_budgets(clock):
+    budget = GeminiBudget(rpm=4)
+    budget.backoff(5)
+    assert budget.scale == 0.5
+    assert budget.quota_errors == 1
+    assert budget.acquire(1)[1] == pytest.approx(5.0)
+    budget.acquire(1)
+    # Two requests fill the halved budget of four per minute
+    assert budget.acquire(1)[1] == pytest.approx(60.0)
@@ -0,0 +1,77 @@
+"""LocalTopicStore: a CSV or Parquet run killed part-way carries on from its output file on the next run."""
+import pandas as pd
+import pytest
+
+TOPICS = ['Remote Work Culture', 'Quantum Computing Basics', 'Sustainable Supply Chains', 'Edge Computing Trends']
+
+
+def write_topics(path):
+    frame = pd.DataFrame({'topic': TOPICS, 'content': ['', 'Written by hand', '', '']})
+    if str(path).endswith('.parquet'):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def read_output(path):
+    return pd.read_parquet(path) if str(path).endswith('.parquet') else pd.read_csv(path)
+
+
+def killed_run(make_agent, topics, output):
+    """Post one row, then die while posting the next"""
+    agent = make_agent([], topics_file=str(topics), topics_output=str(output))
+    agent.topic_store.batch_rows = 1
+    create_post = agent.create_post
+    posted = []
+
+    def create_and_die_on_second(*args, **kwargs):
+        if posted:
+            raise KeyboardInterrupt
+        posted.append(create_post(*args, **kwargs))
+        return posted[-1]
+
+    agent.create_post = create_and_die_on_second
+    with pytest.raises(KeyboardInterrupt):
+        agent.process_spreadsheet_and_post(process_all=True)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_killed_run_resumes_from_output(server, make_agent, tmp_path, extension):
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    topics, output = tmp_path / f'topics{extension}', tmp_path / f'posts{extension}'
+    write_topics(topics)
+    server.post_lookup = True  # Lets the resumed run see that the interrupted post was never created
+
+    killed_run(make_agent, topics, output)
+    assert server.posts == 1
+    if extension == '.csv':
+        assert list(read_output(output)['row']) == [2]  # Appended as soon as its batch of one was full
+
+    make_agent([], topics_file=str(topics), topics_output=str(output)).process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 3  # The row with content is left alone, no row is posted twice
+    frame = read_output(output).sort_values('row')
+    assert list(frame['row']) == [2, 4, 5]
+    assert list(frame['topic']) == [TOPICS[0], TOPICS[2], TOPICS[3]]
+    assert set(frame['status']) == {'done'}
+    assert frame['content'].str.len().min() > 0
+
+    # A finished file has nothing left to do
+    make_agent([], topics_file=str(topics), topics_output=str(output)).process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 3
+    assert len(read_output(output)) == 3
+
+
+def test_default_output_sits_next_to_the_topics(server, make_agent, tmp_path):
+    topics = tmp_path / 'topics.csv'
+    write_topics(topics)
+    make_agent([], topics_file=str(topics), publish_posts=False).process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 0
+    assert len(read_output(tmp_path / 'topics_posts.csv')) == 3
+
+
+def test_output_must_differ_from_topics(server, make_agent, tmp_path):
+    topics = tmp_path / 'topics.csv'
+    write_topics(topics)
+    with pytest.raises(SystemExit):
+        make_agent([], topics_file=str(topics), topics_output=str(topics))
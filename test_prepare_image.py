@@ -0,0 +1,55 @@
+"""LinkedInAgent.prepare_image: images are resized and stripped of metadata even when that saves no bytes."""
+import random
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import linkedin_agent
+
+
+def encode(size, quality, exif=None):
+    output = BytesIO()
+    image = Image.frombytes('RGB', size, random.Random(0).randbytes(size[0] * size[1] * 3))
+    if exif is None:
+        image.save(output, format='JPEG', quality=quality)
+    else:
+        image.save(output, format='JPEG', quality=quality, exif=exif)
+    return output.getvalue()
+
+
+def gps_exif():
+    exif = Image.Exif()
+    exif[0x8825] = {1: 'N', 2: (48.0, 51.0, 29.0)}  # GPSInfo
+    return exif
+
+
+@pytest.fixture
+def agent(server, make_agent):
+    agent = make_agent([['Topic']], process_images=True, image_quality=100)  # Larger than any original
+    yield agent
+    agent.image_pool.shutdown()
+
+
+def test_metadata_is_stripped_even_without_savings(agent):
+    original = encode((64, 64), quality=50, exif=gps_exif())
+    prepared = agent.prepare_image(original)
+    assert len(prepared) >= len(original)
+    with Image.open(BytesIO(prepared)) as image:
+        assert not image.getexif()
+
+
+def test_large_image_is_resized(agent):
+    prepared = agent.prepare_image(encode((2400, 1600), quality=50))
+    with Image.open(BytesIO(prepared)) as image:
+        assert image.size == (1200, 800)
+
+
+def test_clean_image_is_kept_when_nothing_is_saved(agent):
+    original = encode((64, 64), quality=50)
+    assert agent.prepare_image(original) is original
+
+
+def test_pool_does_not_fork(agent):
+    agent.prepare_image(encode((64, 64), quality=50))
+    assert agent.image_pool._mp_context.get_start_method() == 'spawn'
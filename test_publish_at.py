@@ -0,0 +1,53 @@
+"""parse_publish_at: publish times as typed, as Sheets formats them and as Sheets date serials."""
+import datetime
+import time
+
+import pytest
+
+import linkedin_agent
+from linkedin_agent import parse_publish_at
+
+MAY_FIRST = datetime.datetime(2024, 5, 1, 9, 30).timestamp()
+
+
+def serial(moment):
+    """A local datetime as Sheets returns it with valueRenderOption=UNFORMATTED_VALUE"""
+    return (moment - linkedin_agent.SHEET_DATE_EPOCH) / datetime.timedelta(days=1)
+
+
+@pytest.mark.parametrize('value', ['2024-05-01 09:30', '2024-05-01T09:30:00', ' 2024-05-01 9:30:00 ',
+                                   '2024-05-01 9:30'])
+def test_text_publish_times(value):
+    assert parse_publish_at(value) == MAY_FIRST
+
+
+def test_offset_is_honoured():
+    assert parse_publish_at('2024-05-01T09:30:00+00:00') == datetime.datetime(
+        2024, 5, 1, 9, 30, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_sheets_date_serial():
+    assert parse_publish_at(45413.395833333336) == pytest.approx(MAY_FIRST)
+    assert parse_publish_at(45413) == datetime.datetime(2024, 5, 1).timestamp()
+
+
+@pytest.mark.parametrize('value', ['next tuesday', '5/1/2024 9:30:00', ''])
+def test_invalid_publish_times(value):
+    with pytest.raises(ValueError):
+        parse_publish_at(value)
+
+
+def test_sheet_dates_are_scheduled(server, make_agent):
+    now = datetime.datetime.now().replace(microsecond=0)
+    sheet = [['Topic', 'Content', 'Image', 'Status', 'Publish At'],
+             ['Remote Work Culture', '', '', '', serial(now - datetime.timedelta(hours=1))],
+             ['Quantum Computing Basics', '', '', '', serial(now + datetime.timedelta(days=7))]]
+    agent = make_agent(sheet)
+    started = time.monotonic()
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert time.monotonic() - started < 30
+    assert server.posts == 1
+    assert sheet[1][3] == linkedin_agent.SHEET_STATUS_DONE
+    # Due next week: prepared but left pending for a later run
+    assert len(sheet[2]) == 5 and not sheet[2][3]
+    assert agent.load_sheet_cursor() == 2
@@ -0,0 +1,77 @@
+"""Scheduled rows are prepared ahead of their publish time and posted once they are due."""
+import datetime
+import time
+from types import SimpleNamespace
+
+import linkedin_agent
+from linkedin_agent import PublishScheduler
+
+DONE = linkedin_agent.SHEET_STATUS_DONE
+
+
+def publish_time(seconds_from_now):
+    moment = datetime.datetime.now() + datetime.timedelta(seconds=seconds_from_now)
+    return moment.isoformat(sep=' ', timespec='seconds')
+
+
+def test_scheduler_publishes_due_posts_in_order():
+    published = []
+    agent = SimpleNamespace(publish_scheduled=lambda job, due: published.append(job.topic) or job.topic != 'Broken',
+                            topic_store=SimpleNamespace(flush=lambda: True))
+    scheduler = PublishScheduler(agent)
+    now = time.time()
+    for row_index, topic, due in [(3, 'Later', now - 10), (1, 'First', now - 60), (2, 'Broken', now - 30),
+                                  (4, 'Tomorrow', now + 86400)]:
+        assert scheduler.add(SimpleNamespace(row_index=row_index, topic=topic), due)
+    assert not scheduler.add(SimpleNamespace(row_index=1, topic='First'), now)  # Already waiting
+
+    assert scheduler.publish_due() == 3
+    assert published == ['First', 'Broken', 'Later']
+    assert (scheduler.published, scheduler.failed) == (2, [3])
+    assert len(scheduler) == 1
+    assert scheduler.next_due() == now + 86400
+
+
+def test_wait_for_schedule_posts_when_due(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status', 'Publish At'],
+             ['Remote Work Culture', '', '', '', publish_time(2)]]
+    due = linkedin_agent.parse_publish_at(sheet[1][4])
+    agent = make_agent(sheet)
+    agent.hold_scheduled = True  # As run() does with --wait-for-schedule
+    agent.process_spreadsheet_and_post(process_all=True, wait_for_schedule=True)
+    assert time.time() >= due
+    assert server.posts == 1
+    assert sheet[1][3] == DONE
+
+
+def test_rows_due_later_are_prepared_and_left_pending(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status', 'Publish At'],
+             ['Remote Work Culture', '', '', '', publish_time(7 * 86400)]]
+    agent = make_agent(sheet)
+    agent.hold_scheduled = True
+    started = time.monotonic()
+    agent.process_spreadsheet_and_post(process_all=True, wait_for_schedule=True)  # Beyond the horizon
+    assert time.monotonic() - started < 30
+    assert agent.deferred == 1
+    assert server.posts == 0
+    assert server.requests['registerUpload']['calls'] == 1
+    assert not sheet[1][3]
+
+    # Once due, the next run only has the post left to create
+    sheet[1][4] = publish_time(-60)
+    agent = make_agent(sheet)
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 1
+    assert agent.model.calls == 0
+    assert server.requests['registerUpload']['calls'] == 1
+    assert sheet[1][3] == DONE
+
+
+def test_one_shot_run_does_not_wait(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status', 'Publish At'],
+             ['Remote Work Culture', '', '', '', publish_time(3600)]]
+    agent = make_agent(sheet)
+    started = time.monotonic()
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert time.monotonic() - started < 30
+    assert (agent.deferred, len(agent.scheduler), server.posts) == (1, 0, 0)
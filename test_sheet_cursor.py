@@ -0,0 +1,96 @@
+"""The sheet cursor moves past finished and blank rows, so later runs only read new rows."""
+import linkedin_agent
+
+DONE = linkedin_agent.SHEET_STATUS_DONE
+OLD_ROWS = 300
+
+
+def old_sheet():
+    """Rows filled in before the status column existed, a blank row near the top and one new topic"""
+    sheet = [['Topic', 'Content', 'Image', 'Status'], []]
+    sheet += [[f'Old Topic {i}', f'Old post {i}', 'https://example.com/image.jpg'] for i in range(OLD_ROWS)]
+    sheet.append(['Remote Work Culture'])
+    return sheet
+
+
+def reads(agent):
+    return agent.service.values().calls.get('batchGet', 0)
+
+
+def test_cursor_passes_blank_and_finished_rows(server, make_agent):
+    sheet = old_sheet()
+    agent = make_agent(sheet)
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 1
+    assert sheet[-1][3] == DONE
+    # Rows that already had content are marked, so they are not read back again
+    assert all(row[3] == DONE for row in sheet[2:-1])
+    assert agent.load_sheet_cursor() == len(sheet)
+    first_reads = reads(agent)
+
+    sheet.append(['Quantum Computing Basics'])
+    agent = make_agent(sheet)
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 2
+    assert sheet[-1][3] == DONE
+    assert agent.load_sheet_cursor() == len(sheet)
+    assert reads(agent) < first_reads
+
+
+def test_cursor_waits_at_invalid_publish_time(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status', 'Publish At'],
+             ['Remote Work Culture', '', '', '', 'next tuesday'],
+             ['Quantum Computing Basics']]
+    agent = make_agent(sheet)
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 1
+    assert agent.load_sheet_cursor() == 1
+
+    sheet[1][4] = '2000-01-01 09:30'
+    agent = make_agent(sheet)
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 2
+    assert agent.load_sheet_cursor() == len(sheet)
+
+
+def test_sheet_is_read_in_pages(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status']] + [[f'Topic {i}'] for i in range(25)]
+    sheet[12] = []  # A blank row does not end the sheet
+    agent = make_agent(sheet)
+    pages = list(agent.read_spreadsheet(page_rows=10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    rows = [row for page in pages for row in page]
+    assert [row.row_index for row in rows] == list(range(1, 26))
+    assert rows[11].topic == '' and rows[12].topic == 'Topic 12'
+    assert rows[0].row_number == 2
+
+    # Reading stops at the first page without any values
+    sheet[15:] = [[] for _ in range(20)] + [['Far Away Topic']]  # Rows 21-30 are a blank page
+    assert sum(len(page) for page in agent.read_spreadsheet(page_rows=10)) == 14
+
+
+def test_cursor_is_kept_per_spreadsheet(server, make_agent, monkeypatch):
+    agent = make_agent([])
+    agent.save_sheet_cursor(40)
+    monkeypatch.setenv('SPREADSHEET_ID', 'other')
+    other = make_agent([])
+    assert other.load_sheet_cursor() == 1
+    other.save_sheet_cursor(7)
+    assert agent.load_sheet_cursor() == 40
+    assert other.load_sheet_cursor() == 7
+
+
+def test_run_starts_at_the_cursor(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status'], ['Remote Work Culture']]
+    make_agent(sheet).process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 1
+
+    # Content cleared above the cursor is only regenerated with a full scan
+    sheet[1] = ['Remote Work Culture']
+    sheet.append(['Quantum Computing Basics'])
+    make_agent(sheet).process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 2
+    assert sheet[1] == ['Remote Work Culture']
+    make_agent(sheet).process_spreadsheet_and_post(process_all=True, full_scan=True)
+    assert server.posts == 3
+    assert sheet[1][3] == DONE
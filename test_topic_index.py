@@ -0,0 +1,65 @@
+"""TopicIndex: rewordings of a topic share a canonical form, near-duplicates are found by similarity."""
+import pytest
+
+from linkedin_agent import SHEET_STATUS_DONE, TopicIndex
+
+normalize = TopicIndex.normalize
+
+
+def test_case_spacing_order_and_filler_words_are_ignored():
+    assert normalize("AI in Marketing") == normalize("ai  in marketing ") == normalize("Marketing with AI")
+
+
+def test_plural_endings_are_dropped():
+    assert normalize("Remote Teams") == normalize("remote team")
+    assert normalize("Business Process") == "business process"  # -ss is not a plural
+
+
+def test_topic_of_only_filler_words_keeps_its_text():
+    assert normalize("  The  AND ") == "the and"
+
+
+def test_reworded_topic_is_an_exact_duplicate():
+    index = TopicIndex()
+    assert index.add(1, "AI in Marketing") is None
+    assert index.add(2, "Marketing with AI") == (1, 1.0)
+
+
+def test_misspelt_topic_is_a_near_duplicate():
+    index = TopicIndex()
+    assert index.add(1, "Sustainable Supply Chain Management Strategies") is None
+    row, similarity = index.add(2, "Sustainable Suply Chain Management Strategies")
+    assert row == 1
+    assert index.threshold <= similarity < 1.0
+
+
+def test_different_topics_are_kept_apart():
+    index = TopicIndex()
+    assert index.add(1, "Remote Work Culture") is None
+    assert index.add(2, "Quantum Computing Basics") is None
+    assert index.add(3, "Remote Work Culture") == (1, 1.0)
+
+
+@pytest.mark.parametrize('first, second', [
+    ("Python 3.12 Features", "Python 3.13 Features"),
+    ("Leadership Lessons from 2023", "Leadership Lessons from 2024"),
+    ("Top 5 DevOps Tools", "Top 10 DevOps Tools"),
+])
+def test_topics_with_different_numbers_are_kept_apart(first, second):
+    index = TopicIndex()
+    assert index.add(1, first) is None
+    assert index.add(2, second) is None
+
+
+def test_merged_duplicate_is_marked_only_after_its_original_is_posted(server, make_agent):
+    sheet = [['Topic', 'Content', 'Image', 'Status'], ['AI in Marketing'], ['Marketing with AI']]
+    agent = make_agent(sheet, dedupe='merge')
+    agent.post_to_linkedin = lambda *args, **kwargs: False
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert sheet[1:] == [['AI in Marketing'], ['Marketing with AI']]
+
+    agent = make_agent(sheet, dedupe='merge')
+    agent.process_spreadsheet_and_post(process_all=True)
+    assert server.posts == 1
+    assert sheet[1][3] == SHEET_STATUS_DONE
+    assert sheet[2][1:] == ['', '', 'duplicate of row 2']
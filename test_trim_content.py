@@ -0,0 +1,33 @@
+"""LinkedInAgent.trim_content: posts are cut at a clean boundary, never mid-word."""
+from linkedin_agent import LinkedInAgent, POST_MAX_CHARS, POST_TRUNCATION_TAG
+
+trim = LinkedInAgent.trim_content
+
+
+def test_short_post_is_kept():
+    post = "🚀 Remote work is here to stay.\n\n#RemoteWork"
+    assert trim(post) == post
+
+
+def test_long_post_is_cut_at_a_sentence_and_tagged():
+    post = "This sentence is complete. " * 200
+    trimmed = trim(post)
+    assert len(trimmed) <= POST_MAX_CHARS
+    assert trimmed.endswith(f"complete.\n\n{POST_TRUNCATION_TAG}")
+
+
+def test_long_post_is_cut_inside_closing_hashtags():
+    body = "Short intro.\n\n"
+    post = body + ' '.join(f"#Tag{i}" for i in range(1000))
+    trimmed = trim(post)
+    assert len(trimmed) <= POST_MAX_CHARS
+    assert POST_TRUNCATION_TAG not in trimmed
+    assert trimmed.split()[-1] in post.split()  # Ends on a whole hashtag
+
+
+def test_truncated_reply_under_the_limit_is_cut_back():
+    assert trim("First point. Second point is cut of", truncated=True) == f"First point.\n\n{POST_TRUNCATION_TAG}"
+
+
+def test_truncated_reply_in_hashtags_drops_the_partial_tag():
+    assert trim("All done.\n\n#AI #Machi", truncated=True) == "All done.\n\n#AI"